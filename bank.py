@@ -0,0 +1,128 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from sudoku import Sudoku
+
+# File layout: header, one index entry per difficulty, then fixed-size records.
+# Each record is a puzzle followed by its solution, two digits per byte.
+MAGIC = b'SDKB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBx')  # magic, version, side, number of index entries
+ENTRY = struct.Struct('<8sII')  # difficulty, first record, record count
+DEFAULT_PATH = 'puzzles.bank'
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+
+def packed_size(side):
+    return (side * side + 1) // 2
+
+
+def pack(board):
+    digits = [num for row in board for num in row]
+    if len(digits) % 2:
+        digits.append(0)
+    return bytes((digits[i] << 4) | digits[i + 1] for i in range(0, len(digits), 2))
+
+
+def unpack(data, side):
+    digits = []
+    for byte in data:
+        digits.append(byte >> 4)
+        digits.append(byte & 0x0F)
+    return [digits[r * side:(r + 1) * side] for r in range(side)]
+
+
+class PuzzleBank:
+    def __init__(self, path=DEFAULT_PATH):
+        self.file = open(path, 'rb')
+        self.data = None
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.side, entries = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} puzzle bank")
+        except Exception:
+            self.close()
+            raise
+        self.grid_size = packed_size(self.side)
+        self.record_size = 2 * self.grid_size
+        self.records_start = HEADER.size + entries * ENTRY.size
+        self.index = {}
+        for n in range(entries):
+            name, first, count = ENTRY.unpack_from(self.data, HEADER.size + n * ENTRY.size)
+            self.index[name.rstrip(b'\0').decode('ascii')] = (first, count)
+
+    @classmethod
+    def open(cls, path=DEFAULT_PATH):
+        # Open the bank at path, or return None if it is missing or unusable
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def count(self, difficulty):
+        return self.index.get(difficulty, (0, 0))[1]
+
+    def get(self, difficulty, n):
+        first, count = self.index[difficulty]
+        if not 0 <= n < count:
+            raise IndexError(n)
+        offset = self.records_start + (first + n) * self.record_size
+        puzzle = unpack(self.data[offset:offset + self.grid_size], self.side)
+        solution = unpack(self.data[offset + self.grid_size:offset + self.record_size], self.side)
+        return puzzle, solution
+
+    def random_puzzle(self, difficulty, rng=random):
+        # A random (puzzle, solution) pair, or None if there are none stored
+        count = self.count(difficulty)
+        if not count:
+            return None
+        return self.get(difficulty, rng.randrange(count))
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build(path, count, difficulties=DIFFICULTIES, workers=None, seed=None):
+    # Fill a new bank with `count` puzzles per difficulty. The file is written
+    # next to path and moved into place only once it is complete.
+    sudoku = Sudoku(seed=seed)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, sudoku.side, len(difficulties)))
+        for n, difficulty in enumerate(difficulties):
+            f.write(ENTRY.pack(difficulty.encode('ascii'), n * count, count))
+        for difficulty in difficulties:
+            for puzzle, solution in sudoku.generate_many(count, difficulty, workers=workers):
+                f.write(pack(puzzle))
+                f.write(pack(solution))
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a precomputed Sudoku puzzle bank.")
+    parser.add_argument('--out', default=DEFAULT_PATH, help="bank file to write")
+    parser.add_argument('--count', type=int, default=1000, help="puzzles per difficulty")
+    parser.add_argument('--workers', type=int, default=None, help="generator processes")
+    parser.add_argument('--seed', type=int, default=None, help="seed for a reproducible bank")
+    args = parser.parse_args()
+    build(args.out, args.count, workers=args.workers, seed=args.seed)
+    with PuzzleBank(args.out) as bank:
+        for difficulty in DIFFICULTIES:
+            print(f"{difficulty}: {bank.count(difficulty)} puzzles")
+
+
+if __name__ == '__main__':
+    main()
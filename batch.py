@@ -0,0 +1,71 @@
+import numpy as np
+
+# Batch checks over many boards at once. Needs NumPy, which the game
+# itself does not; only bulk pipelines import this module.
+
+
+def check_boards(boards):
+    # boards: array-like of shape (N, side, side), 0 for blanks.
+    # Returns a dict of arrays:
+    #   valid       (N,)             no digit repeats in any row, column or box
+    #                                and every value is in range
+    #   complete    (N,)             no blanks left
+    #   solved      (N,)             valid and complete
+    #   conflicts   (N, side, side)  cells whose digit repeats in one of its units
+    #   candidates  (N, side, side)  bitmask of digits still allowed in each
+    #                                blank cell (bit d for digit d + 1), 0 if filled
+    #   viable      (N,)             valid and no blank cell is out of candidates,
+    #                                a cheap filter before the uniqueness solver
+    boards = np.asarray(boards)
+    n, side = boards.shape[0], boards.shape[1]
+    base = int(round(side ** 0.5))
+    if base * base != side or boards.shape != (n, side, side):
+        raise ValueError(f"expected boards of shape (N, side, side), got {boards.shape}")
+    in_range = ((boards >= 0) & (boards <= side)).all(axis=(1, 2))
+    filled = boards > 0
+    # One bit per cell for its digit (bit d for digit d + 1), 0 for blanks
+    # and out-of-range values
+    dtype = np.uint16 if side <= 16 else np.uint32
+    digits = np.where(filled & (boards <= side), boards, 0).astype(dtype)
+    bits = np.where(digits > 0, np.left_shift(dtype(1), digits - dtype(1)), dtype(0)).astype(dtype)
+
+    # Lay every unit out as a row: (N, unit, cell in unit)
+    rows = bits
+    cols = bits.transpose(0, 2, 1)
+    boxes = bits.reshape(n, base, base, base, base).transpose(0, 1, 3, 2, 4).reshape(n, side, side)
+
+    def scan(units):
+        # Digits used in each unit, and digits used more than once
+        once = np.zeros(units.shape[:2], dtype=dtype)
+        twice = np.zeros_like(once)
+        for k in range(side):
+            cell = units[:, :, k]
+            twice |= once & cell
+            once |= cell
+        return once, twice
+
+    row_used, row_twice = scan(rows)
+    col_used, col_twice = scan(cols)
+    box_used, box_twice = scan(boxes)
+
+    def per_cell(row_mask, col_mask, box_mask):
+        # Combine per-unit masks into one mask per cell: (N, side, side)
+        # through a (N, band, row in band, stack, column in stack) view
+        cells = (row_mask.reshape(n, base, base, 1, 1) | col_mask.reshape(n, 1, 1, base, base)
+                 | box_mask.reshape(n, base, 1, base, 1))
+        return cells.reshape(n, side, side)
+
+    conflicts = (bits & per_cell(row_twice, col_twice, box_twice)) != 0
+    valid = in_range & ~conflicts.any(axis=(1, 2))
+    complete = filled.all(axis=(1, 2))
+    candidates = np.where(filled, dtype(0), ~per_cell(row_used, col_used, box_used) & dtype((1 << side) - 1))
+    dead_ends = (~filled & (candidates == 0)).any(axis=(1, 2))
+
+    return {
+        'valid': valid,
+        'complete': complete,
+        'solved': valid & complete,
+        'conflicts': conflicts,
+        'candidates': candidates,
+        'viable': valid & ~dead_ends,
+    }
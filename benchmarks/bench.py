@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sudoku import Sudoku  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'corpus.txt')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency(samples):
+    # Summary of a list of durations in seconds, reported in milliseconds
+    return {
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def load_corpus(path=CORPUS):
+    puzzles = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                puzzles.append([[int(ch) for ch in line[r * 9:(r + 1) * 9]] for r in range(9)])
+    return puzzles
+
+
+def bench_board_generation(count):
+    sudoku = Sudoku(seed=1)
+    start = time.perf_counter()
+    for _ in range(count):
+        sudoku.generate_board()
+    return {'boards_per_second': count / (time.perf_counter() - start)}
+
+
+def bench_puzzle_generation(count):
+    sudoku = Sudoku(seed=2)
+    results = {}
+    for difficulty in ('easy', 'medium', 'hard'):
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            sudoku.generate_puzzle(difficulty)
+            samples.append(time.perf_counter() - start)
+        results[difficulty] = latency(samples)
+    return results
+
+
+def bench_uniqueness(repeat):
+    sudoku = Sudoku()
+    puzzles = load_corpus()
+    samples = []
+    for _ in range(repeat):
+        for puzzle in puzzles:
+            start = time.perf_counter()
+            if sudoku.count_solutions(puzzle) != 1:
+                raise AssertionError("corpus puzzle is not unique")
+            samples.append(time.perf_counter() - start)
+    results = latency(samples)
+    results['total_ms'] = sum(samples) * 1000 / repeat
+    return results
+
+
+def bench_frame_time(frames):
+    # Headless SudokuGUI.update: one selection move per frame, plus full redraws
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # Keep stdout pure JSON
+    try:
+        import pygame  # noqa: F401
+    except ImportError:
+        return {'skipped': 'pygame is not installed'}
+    from gui import SudokuGUI
+    from session import GameSession
+    gui = SudokuGUI(GameSession())
+    puzzle, solution = Sudoku(seed=3).generate_puzzle('medium')
+    gui.initialize_game(puzzle, solution)
+    gui.update()
+    moves, full = [], []
+    for n in range(frames):
+        gui.selected_cell = (n % gui.side, (n // gui.side) % gui.side)
+        start = time.perf_counter()
+        gui.update()
+        moves.append(time.perf_counter() - start)
+    for _ in range(max(1, frames // 10)):
+        gui.drawn_cells = None
+        start = time.perf_counter()
+        gui.update()
+        full.append(time.perf_counter() - start)
+    return {'frame': latency(moves), 'full_redraw': latency(full)}
+
+
+def best(a, b, name=''):
+    # Merge two result trees keeping the better value of every metric
+    if isinstance(a, dict):
+        return {key: best(a[key], b[key], key) for key in a}
+    if not isinstance(a, (int, float)):
+        return a
+    return max(a, b) if name.endswith('_per_second') else min(a, b)
+
+
+def run(quick=False, rounds=3):
+    # Every case runs `rounds` times and keeps its best numbers, which keeps
+    # scheduler noise out of the comparison with the baseline
+    scale = 1 if quick else 5
+    results = None
+    for _ in range(rounds):
+        current = {
+            'board_generation': bench_board_generation(2000 * scale),
+            'puzzle_generation': bench_puzzle_generation(20 * scale),
+            'uniqueness': bench_uniqueness(scale),
+            'frame_time': bench_frame_time(100 * scale),
+        }
+        results = current if results is None else best(results, current)
+    return results
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def regressions(results, baseline, threshold):
+    # Metrics that got worse than baseline by more than threshold (a fraction).
+    # Rates (*_per_second) should not drop; everything else is a time.
+    found = []
+    current = flatten(results)
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith('_per_second'):
+            change = (old - new) / old
+        else:
+            change = (new - old) / old
+        if change > threshold:
+            found.append({'metric': name, 'baseline': old, 'current': new, 'change': change})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Sudoku generation, solving and rendering.")
+    parser.add_argument('--quick', action='store_true', help="fewer iterations")
+    parser.add_argument('--rounds', type=int, default=3, help="runs per case, best result kept")
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.5, help="allowed slowdown as a fraction")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    args = parser.parse_args()
+
+    results = run(quick=args.quick, rounds=args.rounds)
+    report = {'results': results, 'regressions': []}
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report['regressions'] = regressions(results, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for found in report['regressions']:
+        print(f"regression: {found['metric']} {found['baseline']:.4g} -> {found['current']:.4g} "
+              f"({found['change']:+.0%})", file=sys.stderr)
+    return 1 if report['regressions'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, 'corpus.txt')
+ENDPOINTS = ('generate', 'solve', 'validate', 'hint')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_corpus(path=CORPUS):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def payloads(endpoint, corpus, difficulty, rng):
+    # Endless request bodies for one endpoint
+    while True:
+        if endpoint == 'generate':
+            yield {'difficulty': difficulty}
+        else:
+            yield {'puzzle': rng.choice(corpus)}
+
+
+async def client(host, port, endpoint, bodies, deadline, remaining, latencies, statuses):
+    # One keep-alive connection sending requests back to back
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline and remaining[0] > 0:
+            remaining[0] -= 1
+            body = json.dumps(next(bodies)).encode()
+            request = (f"POST /{endpoint} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                       f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            status = int(lines[0].split()[1])
+            length = 0
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, endpoint, concurrency, requests, duration, difficulty, seed, corpus=CORPUS):
+    corpus = load_corpus(corpus)
+    rng = random.Random(seed)
+    bodies = payloads(endpoint, corpus, difficulty, rng)
+    latencies = []
+    statuses = {}
+    remaining = [requests]
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(host, port, endpoint, bodies, deadline, remaining, latencies, statuses)
+                           for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    # Latencies and throughput count successful requests; 503s show in statuses
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': sum(statuses.values()),
+        'seconds': seconds,
+        'throughput_rps': len(latencies) / seconds if seconds else 0.0,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000,
+            'p90': percentile(latencies, 90) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'max': max(latencies) * 1000,
+        } if latencies else {},
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn(port, workers):
+    # Start server.py on port and wait until it accepts connections
+    command = [sys.executable, os.path.join(ROOT, 'server.py'), '--port', str(port)]
+    if workers:
+        command += ['--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the puzzle server and report latency percentiles.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--endpoint', default='solve', choices=ENDPOINTS)
+    parser.add_argument('--concurrency', type=int, default=32, help="open connections")
+    parser.add_argument('--requests', type=int, default=2000, help="stop after this many requests")
+    parser.add_argument('--duration', type=float, default=30.0, help="or after this many seconds")
+    parser.add_argument('--difficulty', default='medium', help="for --endpoint generate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', default=CORPUS, help="puzzle lines to send to solve, validate and hint")
+    parser.add_argument('--spawn', action='store_true', help="start a local server on a free port for the run")
+    parser.add_argument('--workers', type=int, default=None, help="server workers with --spawn")
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        args.host, args.port = '127.0.0.1', free_port()
+        process = spawn(args.port, args.workers)
+    try:
+        report = asyncio.run(run(args.host, args.port, args.endpoint, args.concurrency, args.requests,
+                                 args.duration, args.difficulty, args.seed, args.corpus))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
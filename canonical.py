@@ -0,0 +1,267 @@
+import json
+import sqlite3
+from collections import OrderedDict
+from itertools import permutations, product
+
+from grader import Grader
+from sudoku import Sudoku
+
+# Canonical form of a puzzle under the Sudoku symmetries: transposition, band
+# and stack order, row order within bands, column order within stacks and
+# relabeling of the digits. Equivalent puzzles have the same form, so results
+# worked out for one can be reused for all of them.
+#
+# The form is the least grid in row-major order, blanks first, with digits
+# numbered in order of first appearance. It is built one row at a time,
+# keeping only the transformations that tie for the least rows so far.
+# The search is exhaustive only for boards up to 9x9; larger boards keep
+# their own layout as their key.
+KEY_SYMBOLS = '0123456789ABCDEFGHIJKLMNOP'
+MAX_BASE = 3
+
+
+def transposed(board):
+    return [list(col) for col in zip(*board)]
+
+
+def board_key(board):
+    return ''.join(KEY_SYMBOLS[num] for row in board for num in row)
+
+
+def key_board(key, side):
+    cells = [KEY_SYMBOLS.index(ch) for ch in key]
+    return [cells[r * side:(r + 1) * side] for r in range(side)]
+
+
+class Transform:
+    # Maps a board to its canonical form: transpose first if asked, then take
+    # rows and cols in the given order and relabel digits through digits
+    def __init__(self, transpose, rows, cols, digits):
+        self.transpose = transpose
+        self.rows = rows
+        self.cols = cols
+        self.digits = digits
+
+    def apply(self, board):
+        if self.transpose:
+            board = transposed(board)
+        return [[self.digits[board[r][c]] if board[r][c] else 0 for c in self.cols] for r in self.rows]
+
+    def invert(self, board):
+        # Map a canonical board (for example the canonical solution) back
+        inverse = {new: old for old, new in self.digits.items()}
+        side = len(board)
+        result = [[0] * side for _ in range(side)]
+        for i, r in enumerate(self.rows):
+            for j, c in enumerate(self.cols):
+                num = board[i][j]
+                result[r][c] = inverse[num] if num else 0
+        return transposed(result) if self.transpose else result
+
+
+def place_row(row, layout, digits, best=None):
+    # Lay row out over layout, a tuple of column groups whose order within
+    # each group is still free, as the least form: in every group blanks
+    # first, then digits already labeled, then new digits, labeled in turn.
+    # Returns the form and the refined groups, where each group of new
+    # digits is a list whose order is still to be chosen, or None as soon as
+    # the form is bound to come out greater than best.
+    form = []
+    groups = []
+    label = len(digits)
+    below = best is None
+    for group in layout:
+        blanks = tuple(c for c in group if not row[c])
+        known = sorted((digits[row[c]], c) for c in group if row[c] in digits)
+        new = [c for c in group if row[c] and row[c] not in digits]
+        form.extend([0] * len(blanks))
+        form.extend(number for number, _ in known)
+        form.extend(range(label + 1, label + 1 + len(new)))
+        label += len(new)
+        if not below:
+            prefix = best[:len(form)]
+            if tuple(form) > prefix:
+                return None
+            below = tuple(form) < prefix
+        if blanks:
+            groups.append(blanks)
+        groups.extend((c,) for _, c in known)
+        if new:
+            groups.append(new)
+    return tuple(form), groups
+
+
+def expand(row, groups, digits):
+    # Every (layout, digits) the refined groups stand for: one per order of
+    # the new digits in each group, which all give the same form
+    choices = [permutations(group) if isinstance(group, list) else (group,) for group in groups]
+    results = []
+    for picked in product(*choices):
+        layout = []
+        labels = dict(digits)
+        for group, order in zip(groups, picked):
+            if isinstance(group, list):
+                for c in order:
+                    labels[row[c]] = len(labels) + 1
+                    layout.append((c,))
+            else:
+                layout.append(order)
+        results.append((tuple(layout), labels))
+    return results
+
+
+def canonical_form(board):
+    # (key, transform): key is the canonical grid as one line and
+    # transform.apply(board) gives that grid
+    side = len(board)
+    base = int(round(side ** 0.5))
+    if base > MAX_BASE:
+        return board_key(board), Transform(False, tuple(range(side)), tuple(range(side)),
+                                           {d: d for d in range(1, side + 1)})
+    grids = (board, transposed(board))
+    stacks = [tuple(range(s * base, (s + 1) * base)) for s in range(base)]
+    # A state is (transpose, rows so far, column layout, digit labels)
+    states = [(t, (), tuple(stacks[s] for s in order), {})
+              for t in range(2) for order in permutations(range(base))]
+    for n in range(side):
+        best = None
+        found = {}
+        for t, rows, layout, digits in states:
+            grid = grids[t]
+            if n % base:
+                band = rows[-1] // base
+                candidates = [r for r in range(band * base, (band + 1) * base) if r not in rows]
+            else:
+                candidates = [r for r in range(side) if r not in rows]
+            for r in candidates:
+                placed = place_row(grid[r], layout, digits, best)
+                if placed is None:
+                    continue
+                form, groups = placed
+                if best is None or form < best:
+                    best = form
+                    found = {}
+                if form == best:
+                    for new_layout, labels in expand(grid[r], groups, digits):
+                        # States with the same rows left, layout and labels
+                        # finish the same way; keep one
+                        seen = (t, frozenset(rows + (r,)), new_layout, frozenset(labels.items()))
+                        found.setdefault(seen, (t, rows + (r,), new_layout, labels))
+        states = list(found.values())
+
+    t, rows, layout, digits = states[0]
+    # Digits missing from the puzzle take the remaining labels in order
+    label = len(digits)
+    for d in range(1, side + 1):
+        if d not in digits:
+            label += 1
+            digits[d] = label
+    transform = Transform(bool(t), rows, tuple(c for group in layout for c in group), digits)
+    return board_key(transform.apply(board)), transform
+
+
+def canonical_key(board):
+    return canonical_form(board)[0]
+
+
+def dedupe(boards, keys=None):
+    # Yield each board unless an equivalent one came earlier. keys, if given,
+    # are the boards' canonical keys worked out elsewhere, in the same order;
+    # a None key (a board that could not be keyed) is never a duplicate.
+    seen = set()
+    pairs = ((board, canonical_key(board)) for board in boards) if keys is None else zip(boards, keys)
+    for board, key in pairs:
+        if key is None or key not in seen:
+            seen.add(key)
+            yield board
+
+
+class PuzzleCache:
+    # Solve, uniqueness and grade results by canonical key. Results are kept
+    # for the canonical puzzle and mapped back through the transform. An LRU
+    # of `size` entries sits in front of an optional SQLite file at path.
+    def __init__(self, base=3, size=4096, path=None):
+        self.base = base
+        self.side = base * base
+        self.sudoku = Sudoku(base)
+        self.grader = None
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        self.unsaved = 0
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data TEXT NOT NULL)')
+
+    def entry(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        entry = {}
+        if self.db:
+            row = self.db.execute('SELECT data FROM results WHERE key = ?', (key,)).fetchone()
+            if row:
+                entry = json.loads(row[0])
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def result(self, key, name, compute):
+        entry = self.entry(key)
+        if name in entry:
+            self.hits += 1
+            return entry[name]
+        self.misses += 1
+        entry[name] = compute()
+        if self.db:
+            self.db.execute('INSERT OR REPLACE INTO results (key, data) VALUES (?, ?)', (key, json.dumps(entry)))
+            self.unsaved += 1
+            if self.unsaved >= 256:
+                self.flush()
+        return entry[name]
+
+    def solve(self, board):
+        key, transform = canonical_form(board)
+
+        def compute():
+            solution = self.sudoku.solve(key_board(key, self.side))
+            return board_key(solution) if solution else None
+        solution = self.result(key, 'solution', compute)
+        return transform.invert(key_board(solution, self.side)) if solution else None
+
+    def count_solutions(self, board):
+        # Solutions of board, counted up to 2 (0, 1 or 2 meaning several)
+        key = canonical_key(board)
+        return self.result(key, 'count', lambda: self.sudoku.count_solutions(key_board(key, self.side)))
+
+    def grade(self, board):
+        # Grade of the canonical puzzle; the grader's scores can differ by a
+        # few points between equivalent puzzles, the level does not
+        key = canonical_key(board)
+        if self.grader is None:
+            self.grader = Grader(self.base)
+        return self.result(key, 'grade', lambda: self.grader.grade(key_board(key, self.side)))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+        }
+
+    def flush(self):
+        if self.db:
+            self.db.commit()
+            self.unsaved = 0
+
+    def close(self):
+        if self.db:
+            self.flush()
+            self.db.close()
+            self.db = None
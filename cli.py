@@ -0,0 +1,238 @@
+import argparse
+import fileinput
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, tee
+
+from canonical import PuzzleCache, canonical_key, dedupe
+from grader import LEVELS, Grader
+from sudoku import Sudoku, regenerate
+
+# One-line puzzle format: side * side symbols, '0' or '.' for blanks. Input
+# lines may also be seed ids (see sudoku.seed_id), regenerated on the workers.
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+BLANKS = '0.'
+
+
+def parse_line(line):
+    line = line.strip()
+    side = int(round(len(line) ** 0.5))
+    base = int(round(side ** 0.5))
+    if base < 2 or base * base != side or side * side != len(line) or side > len(SYMBOLS):
+        raise ValueError(f"not a puzzle line: {line!r}")
+    digits = []
+    for ch in line.upper():
+        if ch in BLANKS:
+            digits.append(0)
+        elif ch in SYMBOLS[:side]:
+            digits.append(SYMBOLS.index(ch) + 1)
+        else:
+            raise ValueError(f"bad symbol {ch!r} in {line!r}")
+    return [digits[r * side:(r + 1) * side] for r in range(side)]
+
+
+def format_board(board):
+    return ''.join(SYMBOLS[num - 1] if num else '0' for row in board for num in row)
+
+
+class Engine:
+    # Per-process cache of one Sudoku and Grader per board size, and with
+    # use_cache one PuzzleCache per size keyed by canonical form
+    def __init__(self):
+        self.sudokus = {}
+        self.graders = {}
+        self.caches = None
+        self.cache_path = None
+
+    def use_cache(self, path=None):
+        if self.caches is None or path != self.cache_path:
+            self.caches = {}
+            self.cache_path = path
+
+    def cache(self, board):
+        base = int(round(len(board) ** 0.5))
+        if base not in self.caches:
+            self.caches[base] = PuzzleCache(base, path=self.cache_path)
+        return self.caches[base]
+
+    def cache_counts(self):
+        caches = (self.caches or {}).values()
+        return sum(cache.hits for cache in caches), sum(cache.misses for cache in caches)
+
+    def flush(self):
+        for cache in (self.caches or {}).values():
+            cache.flush()
+
+    def sudoku(self, board):
+        base = int(round(len(board) ** 0.5))
+        if base not in self.sudokus:
+            self.sudokus[base] = Sudoku(base)
+        return self.sudokus[base]
+
+    def grader(self, board):
+        base = int(round(len(board) ** 0.5))
+        if base not in self.graders:
+            self.graders[base] = Grader(base)
+        return self.graders[base]
+
+    def solve(self, board):
+        source = self.cache(board) if self.caches is not None else self.sudoku(board)
+        solution = source.solve(board)
+        return format_board(solution) if solution else 'unsolvable'
+
+    def validate(self, board):
+        source = self.cache(board) if self.caches is not None else self.sudoku(board)
+        count = source.count_solutions(board)
+        status = {0: 'unsolvable', 1: 'unique'}.get(count, 'multiple')
+        return f"{format_board(board)} {status}"
+
+    def grade(self, board):
+        source = self.cache(board) if self.caches is not None else self.grader(board)
+        result = source.grade(board)
+        return f"{format_board(board)} {result['level']} {result['score']} {result['hardest'] or '-'}"
+
+    def canonical(self, board):
+        # Canonical keys use the one-line format
+        return canonical_key(board)
+
+    def run(self, command, line):
+        try:
+            board = parse_line(line)
+        except ValueError:
+            try:
+                board = regenerate(line.strip())[0]
+            except ValueError:
+                return 'invalid'
+        return getattr(self, command)(board)
+
+
+_engine = Engine()
+
+
+def _run_chunk(command, lines, cache=False, cache_path=None):
+    # Returns the output lines and the cache hits and misses they took
+    if cache:
+        _engine.use_cache(cache_path)
+    hits, misses = _engine.cache_counts()
+    results = [_engine.run(command, line) for line in lines]
+    _engine.flush()
+    now_hits, now_misses = _engine.cache_counts()
+    return results, now_hits - hits, now_misses - misses
+
+
+def process(command, lines, workers=None, chunksize=64, cache=False, cache_path=None, stats=None):
+    # Run command over lines, yielding one output line per input line in
+    # input order. Only a few chunks per worker are read ahead, so memory
+    # stays flat however long the input is. With cache, results are looked up
+    # by canonical form first (in cache_path too if given) and stats, if a
+    # dict, collects the hits and misses.
+    workers = workers or os.cpu_count() or 1
+    stats = {} if stats is None else stats
+    stats.setdefault('hits', 0)
+    stats.setdefault('misses', 0)
+
+    def collect(result):
+        results, hits, misses = result
+        stats['hits'] += hits
+        stats['misses'] += misses
+        return results
+
+    lines = iter(lines)
+    if workers == 1:
+        while True:
+            chunk = list(islice(lines, chunksize))
+            if not chunk:
+                return
+            yield from collect(_run_chunk(command, chunk, cache, cache_path))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < workers * 2:
+                chunk = list(islice(lines, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_run_chunk, command, chunk, cache, cache_path))
+            if not pending:
+                return
+            yield from collect(pending.popleft().result())
+
+
+def read_lines(paths):
+    # Non-empty, non-comment lines from the given files, or stdin
+    with fileinput.input(paths or ('-',)) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m sudoku', description="Headless Sudoku tools.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, text in (('solve', "print the solution of each puzzle"),
+                       ('validate', "report unique, multiple or unsolvable for each puzzle"),
+                       ('grade', "print the technique grade, score and hardest technique"),
+                       ('canonical', "print the canonical form of each puzzle under the Sudoku symmetries"),
+                       ('dedupe', "print each puzzle not equivalent to an earlier one")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument('files', nargs='*', help="puzzle files, one per line (default stdin)")
+        command.add_argument('--workers', type=int, default=None, help="worker processes")
+        command.add_argument('--chunksize', type=int, default=64, help="lines per worker task")
+        if name in ('solve', 'validate', 'grade'):
+            command.add_argument('--cache', action='store_true', help="reuse results for equivalent puzzles")
+            command.add_argument('--cache-file', default=None, metavar='PATH',
+                                 help="keep cached results in this SQLite file (implies --cache)")
+    generate = commands.add_parser('generate', help="generate new puzzles")
+    generate.add_argument('-n', '--count', type=int, default=1, help="number of puzzles")
+    generate.add_argument('--difficulty', default='medium', choices=('easy', 'medium', 'hard'))
+    generate.add_argument('--grade', default=None, choices=LEVELS, help="target technique grade")
+    generate.add_argument('--size', type=int, default=9, choices=(4, 9, 16, 25), help="board side")
+    generate.add_argument('--seed', type=int, default=None, help="seed for a reproducible batch")
+    generate.add_argument('--workers', type=int, default=None, help="worker processes")
+    generate.add_argument('--solutions', action='store_true', help="print each solution after its puzzle")
+    generate.add_argument('--ids', action='store_true', help="print seed ids instead of grids")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    try:
+        if args.command == 'generate':
+            sudoku = Sudoku(int(round(args.size ** 0.5)))
+            for puzzle, solution, seed_id in sudoku.generate_many(args.count, args.difficulty,
+                                                                  workers=args.workers, seed=args.seed,
+                                                                  grade=args.grade, ids=True):
+                if args.ids:
+                    line = seed_id
+                else:
+                    line = format_board(puzzle)
+                    if args.solutions:
+                        line += ' ' + format_board(solution)
+                out.write(line + '\n')
+        elif args.command == 'dedupe':
+            # Keys are worked out on the pool; the first line of each class
+            # wins. tee only holds the lines process() has read ahead.
+            lines, keyed = tee(read_lines(args.files))
+            keys = process('canonical', keyed, workers=args.workers, chunksize=args.chunksize)
+            for line in dedupe(lines, (None if key == 'invalid' else key for key in keys)):
+                out.write(line + '\n')
+        else:
+            lines = read_lines(args.files)
+            cache_path = getattr(args, 'cache_file', None)
+            cache = getattr(args, 'cache', False) or cache_path is not None
+            stats = {}
+            for line in process(args.command, lines, workers=args.workers, chunksize=args.chunksize,
+                                cache=cache, cache_path=cache_path, stats=stats):
+                out.write(line + '\n')
+            if cache:
+                lookups = stats['hits'] + stats['misses']
+                rate = stats['hits'] / lookups if lookups else 0.0
+                print(f"cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {rate:.1%}", file=sys.stderr)
+    except BrokenPipeError:
+        # Output closed early, e.g. piped into head
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from solver import BitmaskSolver
+
+# Grades in order of the hardest technique a puzzle needs
+LEVELS = ('easy', 'medium', 'hard', 'expert')
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+class Grader:
+    # Solves a puzzle the way a person would, applying the simplest technique
+    # that makes progress each step. Candidates are kept as one bitmask per
+    # cell. A puzzle the ladder cannot finish needs guessing and is 'expert'.
+    def __init__(self, base=3):
+        self.geometry = BitmaskSolver(base)
+        self.base = base
+        self.side = self.geometry.side
+        self.size = self.geometry.size
+        self.units = self.geometry.units
+        side = self.side
+        self.rows = self.units[:side]
+        self.cols = self.units[side:2 * side]
+        self.boxes = self.units[2 * side:]
+        self.peers = []
+        for i in range(self.size):
+            peers = set(self.rows[self.geometry.row_of[i]])
+            peers.update(self.cols[self.geometry.col_of[i]])
+            peers.update(self.boxes[self.geometry.box_of[i]])
+            peers.discard(i)
+            self.peers.append(tuple(peers))
+        # (name, weight per use, level, step); step returns how many times it applied
+        self.techniques = [
+            ('hidden single', 1, 'easy', self.hidden_singles),
+            ('naked single', 2, 'medium', self.naked_singles),
+            ('pointing', 4, 'medium', self.pointing),
+            ('claiming', 4, 'medium', self.claiming),
+            ('naked pair', 6, 'hard', lambda cells, cands: self.naked_subsets(cells, cands, 2)),
+            ('hidden pair', 7, 'hard', lambda cells, cands: self.hidden_subsets(cells, cands, 2)),
+            ('naked triple', 8, 'hard', lambda cells, cands: self.naked_subsets(cells, cands, 3)),
+            ('hidden triple', 9, 'hard', lambda cells, cands: self.hidden_subsets(cells, cands, 3)),
+            ('x-wing', 10, 'hard', lambda cells, cands: self.fish(cells, cands, 2)),
+            ('swordfish', 12, 'hard', lambda cells, cands: self.fish(cells, cands, 3)),
+        ]
+        self.guess_weight = 20
+
+    def grade(self, board):
+        # Returns {'score', 'hardest', 'level', 'solved', 'counts'}. score adds
+        # the weight of every technique use; hardest is the top rung reached,
+        # 'guessing' when the ladder gets stuck.
+        cells = [num for row in board for num in row]
+        cands = [0] * self.size
+        for i in range(self.size):
+            if not cells[i]:
+                cands[i] = self.geometry.all_digits
+        for i in range(self.size):
+            if cells[i]:
+                self.eliminate_peers(cands, i, cells[i])
+        counts = {}
+        score = 0
+        hardest = -1
+        while 0 in cells:
+            for index, (name, weight, level, step) in enumerate(self.techniques):
+                used = step(cells, cands)
+                if used:
+                    counts[name] = counts.get(name, 0) + used
+                    score += weight * used
+                    hardest = max(hardest, index)
+                    break
+            else:
+                return {
+                    'score': score + self.guess_weight,
+                    'hardest': 'guessing',
+                    'level': LEVELS[-1],
+                    'solved': False,
+                    'counts': counts,
+                }
+        name, weight, level, step = self.techniques[max(hardest, 0)]
+        return {
+            'score': score,
+            'hardest': name if hardest >= 0 else None,
+            'level': level,
+            'solved': True,
+            'counts': counts,
+        }
+
+    def level(self, board):
+        return self.grade(board)['level']
+
+    def eliminate_peers(self, cands, i, num):
+        mask = ~(1 << (num - 1))
+        for p in self.peers[i]:
+            cands[p] &= mask
+
+    def place(self, cells, cands, i, num):
+        cells[i] = num
+        cands[i] = 0
+        self.eliminate_peers(cands, i, num)
+
+    def hidden_singles(self, cells, cands):
+        used = 0
+        for unit in self.units:
+            once = twice = 0
+            for i in unit:
+                twice |= once & cands[i]
+                once |= cands[i]
+            hidden = once & ~twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if cands[i] & bit:
+                        self.place(cells, cands, i, bit.bit_length())
+                        used += 1
+                        break
+        return used
+
+    def naked_singles(self, cells, cands):
+        used = 0
+        for i in range(self.size):
+            mask = cands[i]
+            if mask and not mask & (mask - 1):
+                self.place(cells, cands, i, mask.bit_length())
+                used += 1
+        return used
+
+    def restrict(self, cands, targets, mask):
+        # Remove mask from the candidates of targets; True if anything changed
+        changed = False
+        for i in targets:
+            if cands[i] & mask:
+                cands[i] &= ~mask
+                changed = True
+        return changed
+
+    def pointing(self, cells, cands):
+        # A digit confined to one line within a box leaves the rest of that line
+        used = 0
+        for box in self.boxes:
+            for d in range(self.side):
+                bit = 1 << d
+                spots = [i for i in box if cands[i] & bit]
+                if len(spots) < 2:
+                    continue
+                for line_of, lines in ((self.geometry.row_of, self.rows), (self.geometry.col_of, self.cols)):
+                    line = line_of[spots[0]]
+                    if all(line_of[i] == line for i in spots):
+                        outside = [i for i in lines[line] if i not in box]
+                        if self.restrict(cands, outside, bit):
+                            used += 1
+        return used
+
+    def claiming(self, cells, cands):
+        # A digit confined to one box within a line leaves the rest of that box
+        used = 0
+        box_of = self.geometry.box_of
+        for line in self.rows + self.cols:
+            for d in range(self.side):
+                bit = 1 << d
+                spots = [i for i in line if cands[i] & bit]
+                if len(spots) < 2:
+                    continue
+                box = box_of[spots[0]]
+                if all(box_of[i] == box for i in spots):
+                    outside = [i for i in self.boxes[box] if i not in line]
+                    if self.restrict(cands, outside, bit):
+                        used += 1
+        return used
+
+    def naked_subsets(self, cells, cands, size):
+        # size cells in a unit sharing only size digits own those digits
+        used = 0
+        for unit in self.units:
+            small = [i for i in unit if 2 <= popcount(cands[i]) <= size]
+            if len(small) < size:
+                continue
+            for group in combinations(small, size):
+                mask = 0
+                for i in group:
+                    mask |= cands[i]
+                if popcount(mask) == size:
+                    others = [i for i in unit if i not in group]
+                    if self.restrict(cands, others, mask):
+                        used += 1
+        return used
+
+    def hidden_subsets(self, cells, cands, size):
+        # size digits confined to the same size cells of a unit own those cells
+        used = 0
+        for unit in self.units:
+            spots = {}
+            for d in range(self.side):
+                where = 0
+                for n, i in enumerate(unit):
+                    if cands[i] >> d & 1:
+                        where |= 1 << n
+                if 2 <= popcount(where) <= size:
+                    spots[d] = where
+            if len(spots) < size:
+                continue
+            for digits in combinations(spots, size):
+                where = 0
+                for d in digits:
+                    where |= spots[d]
+                if popcount(where) != size:
+                    continue
+                keep = 0
+                for d in digits:
+                    keep |= 1 << d
+                targets = [i for n, i in enumerate(unit) if where >> n & 1]
+                if self.restrict(cands, targets, ~keep):
+                    used += 1
+        return used
+
+    def fish(self, cells, cands, size):
+        # A digit confined to the same size columns in size rows (or the
+        # transpose) leaves the rest of those columns (rows)
+        used = 0
+        for base_lines, cover_lines in ((self.rows, self.cols), (self.cols, self.rows)):
+            for d in range(self.side):
+                bit = 1 << d
+                spots = {}
+                for n, line in enumerate(base_lines):
+                    where = 0
+                    for m, i in enumerate(line):
+                        if cands[i] & bit:
+                            where |= 1 << m
+                    if 2 <= popcount(where) <= size:
+                        spots[n] = where
+                if len(spots) < size:
+                    continue
+                for lines in combinations(spots, size):
+                    where = 0
+                    for n in lines:
+                        where |= spots[n]
+                    if popcount(where) != size:
+                        continue
+                    targets = []
+                    for m in range(self.side):
+                        if where >> m & 1:
+                            targets.extend(i for n, i in enumerate(cover_lines[m]) if n not in lines)
+                    if self.restrict(cands, targets, bit):
+                        used += 1
+        return used
+
+
+def _grade_chunk(base, boards):
+    grader = Grader(base)
+    return [grader.grade(board) for board in boards]
+
+
+def grade_many(boards, base=3, workers=None, chunksize=256):
+    # Grade an iterable of boards on a process pool, yielding grades in input
+    # order. Only a few chunks per worker are held at a time.
+    workers = workers or os.cpu_count() or 1
+    boards = iter(boards)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < workers * 2:
+                chunk = [board for _, board in zip(range(chunksize), boards)]
+                if not chunk:
+                    break
+                pending.append(pool.submit(_grade_chunk, base, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
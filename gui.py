@@ -1,19 +1,26 @@
 import pygame
 import sys
 import time
-import pickle
-import json
+import journal
+from leaderboard import puzzle_id
+
+# Digits as shown and typed; boards larger than 9x9 continue with letters
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+BOARD_BASES = (3, 4, 5, 2)  # Start screen size choices, 9x9 first
 
 class SudokuGUI:
-    def __init__(self):
-        pygame.init()
-        pygame.mixer.init()
-        self.window_size = 600  # Default window size
-        self.cell_size = self.window_size // 9
-        self.window = pygame.display.set_mode((self.window_size, self.window_size + 80), pygame.RESIZABLE)
-        pygame.display.set_caption("Sudoku")
-        self.font = pygame.font.SysFont("arial", 40)
-        self.small_font = pygame.font.SysFont("arial", 20)
+    def __init__(self, session, leaderboard=None):
+        # session: the session.GameSession that owns the window and assets;
+        # it outlives this game, so starting the next one is cheap
+        self.session = session
+        self.window_size = session.window_size
+        self.base = 3
+        self.side = 9
+        self.cell_size = self.window_size // self.side
+        self.window = session.window
+        self.font = session.font(40)
+        self.small_font = session.font(20)
+        self.digit_font = self.font
         self.running = True
         self.play_again = True
         self.clock = pygame.time.Clock()
@@ -25,47 +32,71 @@ class SudokuGUI:
         self.board = None
         self.solution = None
         self.original_puzzle = None
+        self.seed_id = None  # sudoku.seed_id of the puzzle, if it has one
+        # Digit counts per row, column and box, bitmasks of the digits each
+        # unit holds and the number of filled cells, kept in step with board
+        self.row_counts = self.col_counts = self.box_counts = None
+        self.row_masks = self.col_masks = self.box_masks = None
+        self.filled = 0
+        self.show_candidates = False  # Pencil marks in empty cells (C)
         self.difficulty = 'medium'
         self.paused = False
         self.pause_start_time = None
+        # Every action is appended to the autosave journal; K and L copy it
+        # to and from the save slot picked with [ and ]
+        self.journal = None
+        self.save_slot = 1
+        self.resume_game = False
         self.themes = {
             'default': {'bg_color': (255, 255, 255), 'grid_color': (0, 0, 0)},
             'dark': {'bg_color': (30, 30, 30), 'grid_color': (200, 200, 200)},
         }
-        self.current_theme = 'default'
-        # Load sounds
-        self.select_sound = pygame.mixer.Sound('select.wav')
-        self.error_sound = pygame.mixer.Sound('error.wav')
-        self.success_sound = pygame.mixer.Sound('success.wav')
-        # High scores
-        self.high_scores = {'easy': [], 'medium': [], 'hard': []}
-        self.load_high_scores()
-
-    def load_high_scores(self):
-        try:
-            with open('high_scores.json', 'r') as f:
-                self.high_scores = json.load(f)
-        except FileNotFoundError:
-            pass
-
-    def save_high_scores(self):
-        with open('high_scores.json', 'w') as f:
-            json.dump(self.high_scores, f)
-
-    def start_screen(self):
-        # Display start screen with difficulty selection
+        self.current_theme = session.theme
+        # Rendering state: cached digit surfaces and what is currently on screen
+        self.glyphs = {}
+        self.pencil_font = self.small_font
+        self.drawn_layout = None
+        self.drawn_cells = None
+        self.drawn_status = None
+        self.drawn_paused = False
+        # Developer overlay (F3): frame timings and how the puzzle was generated
+        self.show_overlay = False
+        self.generation_stats = {}
+        self.last_frame = None
+        self.frame_time = 0.0
+        self.render_time = 0.0
+        # Completion history (a leaderboard.Leaderboard); wins are not
+        # recorded without one
+        self.leaderboard = leaderboard
+
+    def draw_start_screen(self):
+        # Returns whether there is an autosaved game to continue
         self.window.fill(self.themes[self.current_theme]['bg_color'])
         title_text = self.font.render("Welcome to Sudoku!", True, (0, 0, 0))
         start_text = self.small_font.render("Press E for Easy, M for Medium, H for Hard", True, (0, 0, 0))
         theme_text = self.small_font.render("Press T to Change Theme", True, (0, 0, 0))
+        size_text = self.small_font.render(f"Press S to Change Board Size ({self.side}x{self.side})", True, (0, 0, 0))
         quit_text = self.small_font.render("Press Q to Quit", True, (0, 0, 0))
+        board_text = self.small_font.render("Press B for the Leaderboard", True, (0, 0, 0))
+        can_resume = journal.exists(journal.slot_path(0))
+        resume_text = self.small_font.render("Press L to Continue the Last Game", True, (0, 0, 0))
 
         self.window.blit(title_text, (self.window_size // 2 - title_text.get_width() // 2, self.window_size // 2 - 150))
         self.window.blit(start_text, (self.window_size // 2 - start_text.get_width() // 2, self.window_size // 2 - 50))
         self.window.blit(theme_text, (self.window_size // 2 - theme_text.get_width() // 2, self.window_size // 2))
-        self.window.blit(quit_text, (self.window_size // 2 - quit_text.get_width() // 2, self.window_size // 2 + 50))
+        self.window.blit(size_text, (self.window_size // 2 - size_text.get_width() // 2, self.window_size // 2 + 50))
+        self.window.blit(quit_text, (self.window_size // 2 - quit_text.get_width() // 2, self.window_size // 2 + 100))
+        if self.leaderboard:
+            self.window.blit(board_text, (self.window_size // 2 - board_text.get_width() // 2, self.window_size // 2 + 200))
+        if can_resume:
+            self.window.blit(resume_text, (self.window_size // 2 - resume_text.get_width() // 2, self.window_size // 2 + 150))
 
-        pygame.display.flip()
+        self.session.flip()
+        return can_resume
+
+    def start_screen(self):
+        # Display start screen with difficulty selection
+        can_resume = self.draw_start_screen()
 
         waiting = True
         while waiting:
@@ -89,6 +120,19 @@ class SudokuGUI:
                         self.change_theme()
                         self.start_screen()
                         return
+                    elif event.key == pygame.K_s:
+                        index = BOARD_BASES.index(self.base) if self.base in BOARD_BASES else -1
+                        self.set_board_size(BOARD_BASES[(index + 1) % len(BOARD_BASES)] ** 2)
+                        self.start_screen()
+                        return
+                    elif event.key == pygame.K_b and self.leaderboard:
+                        self.display_leaderboard()
+                        if self.play_again:  # Not if the window was closed
+                            self.start_screen()
+                        return
+                    elif event.key == pygame.K_l and can_resume:
+                        self.resume_game = True
+                        waiting = False
                     elif event.key == pygame.K_q:
                         self.running = False
                         self.play_again = False
@@ -98,11 +142,20 @@ class SudokuGUI:
         themes_list = list(self.themes.keys())
         current_index = themes_list.index(self.current_theme)
         self.current_theme = themes_list[(current_index + 1) % len(themes_list)]
+        self.session.theme = self.current_theme
+
+    def set_board_size(self, side):
+        self.side = side
+        self.base = int(round(side ** 0.5))
+        self.cell_size = self.window_size // self.side
 
-    def initialize_game(self, puzzle, solution):
+    def initialize_game(self, puzzle, solution, seed_id=None):
+        self.set_board_size(len(puzzle))
         self.board = puzzle
         self.solution = solution
         self.original_puzzle = [row[:] for row in puzzle]
+        self.seed_id = seed_id
+        self.track_board()
         self.start_time = time.time()
         self.hints_available = 3
         self.moves = []
@@ -111,33 +164,60 @@ class SudokuGUI:
         self.running = True
         self.paused = False
         self.pause_start_time = None
-
-    def run(self, puzzle, solution):
-        self.initialize_game(puzzle, solution)
+        self.drawn_cells = None
+        if self.journal:
+            self.journal.close()
+        self.journal = journal.Journal.create(journal.slot_path(0), puzzle, solution, self.difficulty,
+                                              self.hints_available, seed_id=seed_id)
+
+    def run(self, puzzle, solution, seed_id=None):
+        # With no puzzle, continue the game in the autosave journal
+        if puzzle is None:
+            self.running = True
+            self.load_game(0)
+            if not self.journal:
+                return
+        else:
+            self.initialize_game(puzzle, solution, seed_id)
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
         while self.running:
-            self.clock.tick(30)
             self.update()
-            for event in pygame.event.get():
+            # Sleep until something happens or the timer display has to change
+            events = [pygame.event.wait(self.time_to_next_tick())] + pygame.event.get()
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.running = False
                     self.play_again = False
 
                 elif event.type == pygame.VIDEORESIZE:
-                    self.window_size = min(event.w, event.h - 80)
-                    self.cell_size = self.window_size // 9
-                    self.window = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
+                    self.session.resize(event.w, event.h)
+                    self.window = self.session.window
+                    self.window_size = self.session.window_size
+                    self.cell_size = self.window_size // self.side
 
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button == 1 and not self.paused:
                         self.select_cell(pygame.mouse.get_pos())
 
                 elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3:
+                        self.show_overlay = not self.show_overlay
+                        self.drawn_cells = None  # Repaint what the overlay covered
+                    num = self.symbol_value(event.unicode)
+                    if num:
+                        # A digit on this board, even if its letter is a command key
+                        if not self.paused and self.selected_cell and \
+                                self.original_puzzle[self.selected_cell[0]][self.selected_cell[1]] == 0:
+                            self.enter_number(num)
+                        continue
                     if event.key == pygame.K_p:
                         self.paused = not self.paused
                         if self.paused:
                             self.pause_start_time = time.time()
+                            self.record(journal.PAUSE)
                         else:
                             self.start_time += time.time() - self.pause_start_time
+                            self.record(journal.RESUME)
                     if self.paused:
                         continue  # Skip other events when paused
                     if event.key == pygame.K_u:
@@ -157,26 +237,21 @@ class SudokuGUI:
                     elif event.key == pygame.K_k:
                         self.save_game()
                     elif event.key == pygame.K_l:
-                        self.load_game()
+                        self.load_game(self.save_slot)
+                    elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                        step = 1 if event.key == pygame.K_RIGHTBRACKET else -1
+                        self.save_slot = (self.save_slot - 1 + step) % journal.SLOTS + 1
+                        self.message = f"Save slot {self.save_slot}"
                     elif event.key == pygame.K_t:
                         self.change_theme()
+                    elif event.key == pygame.K_b and self.leaderboard:
+                        self.display_leaderboard()
+                    elif event.key == pygame.K_c:
+                        self.show_candidates = not self.show_candidates
                     elif event.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN):
                         self.navigate(event.key)
                     elif self.selected_cell and self.original_puzzle[self.selected_cell[0]][self.selected_cell[1]] == 0:
-                        if event.unicode and event.unicode in '123456789':
-                            num = int(event.unicode)
-                            row, col = self.selected_cell
-                            self.moves.append((self.selected_cell, self.board[row][col]))  # Save move for undo
-                            self.board[row][col] = num
-                            self.message = ""
-                            if self.is_puzzle_complete():
-                                if self.board == self.solution:
-                                    self.message = "Congratulations! You've solved the puzzle."
-                                    self.save_completion_time()
-                                    self.success_sound.play()
-                                else:
-                                    self.message = "Puzzle completed, but with errors."
-                        elif event.key in (pygame.K_BACKSPACE, pygame.K_DELETE, pygame.K_0):
+                        if event.key in (pygame.K_BACKSPACE, pygame.K_DELETE, pygame.K_0):
                             self.clear_cell()
                             self.message = ""
                         elif event.key == pygame.K_ESCAPE:
@@ -185,97 +260,259 @@ class SudokuGUI:
                         else:
                             # Ignore other keys
                             pass
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def symbol_value(self, char):
+        # Number typed as char, or 0. Letters must be uppercase (Shift) so
+        # they do not clash with the command keys.
+        if char and char in SYMBOLS[:self.side] and (char.isdigit() or char.isupper()):
+            return SYMBOLS.index(char) + 1
+        return 0
+
+    def enter_number(self, num):
+        row, col = self.selected_cell
+        self.moves.append((self.selected_cell, self.board[row][col]))  # Save move for undo
+        self.record(journal.MOVE, row, col, self.board[row][col], num)
+        self.set_cell(row, col, num)
+        self.message = ""
+        if self.is_puzzle_complete():
+            if self.board == self.solution:
+                self.message = "Congratulations! You've solved the puzzle."
+                self.save_completion_time()
+                self.session.sound('success').play()
+            else:
+                self.message = "Puzzle completed, but with errors."
 
     def navigate(self, key):
         if self.selected_cell:
             row, col = self.selected_cell
             if key == pygame.K_LEFT:
-                col = (col - 1) % 9
+                col = (col - 1) % self.side
             elif key == pygame.K_RIGHT:
-                col = (col + 1) % 9
+                col = (col + 1) % self.side
             elif key == pygame.K_UP:
-                row = (row - 1) % 9
+                row = (row - 1) % self.side
             elif key == pygame.K_DOWN:
-                row = (row + 1) % 9
+                row = (row + 1) % self.side
             self.selected_cell = (row, col)
-            self.select_sound.play()
+            self.session.sound('select').play()
 
     def update(self):
+        start = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_time = start - self.last_frame
+        self.last_frame = start
+        self.render()
+        self.render_time = time.perf_counter() - start
+
+    def render(self):
+        # Redraw only what changed since the last frame
+        layout = self.layout()
+        if layout != self.drawn_layout:
+            # Resize, theme or board size change: rebuild the glyphs and draw everything
+            self.glyphs = {}
+            self.digit_font = self.session.font(max(10, self.cell_size * 40 // 66))
+            self.pencil_font = self.session.font(max(8, self.cell_size // self.base * 3 // 4))
+            self.drawn_layout = layout
+            self.drawn_cells = None
+            self.drawn_paused = False
         if self.paused:
-            self.draw_pause_screen()
-        else:
+            if not self.drawn_paused:
+                self.draw_pause_screen()
+                self.drawn_paused = True
+                self.drawn_cells = None
+            return
+        self.drawn_paused = False
+        if self.drawn_cells is None:
+            self.drawn_cells = [[None] * self.side for _ in range(self.side)]
+            self.drawn_status = None
             self.draw_grid()
-            self.draw_numbers()
-            self.draw_selection()
-            self.draw_message()
-            pygame.display.flip()
+            full = True
+        else:
+            full = False
+        dirty = []
+        for row in range(self.side):
+            for col in range(self.side):
+                state = self.cell_state(row, col)
+                if state != self.drawn_cells[row][col]:
+                    self.drawn_cells[row][col] = state
+                    dirty.append(self.draw_cell(row, col, state))
+        status = self.status_state()
+        if status != self.drawn_status:
+            self.drawn_status = status
+            dirty.append(self.draw_message(status))
+        if self.show_overlay:
+            dirty.append(self.draw_overlay())
+        if full:
+            self.session.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+
+    def layout(self):
+        return self.current_theme, self.side, self.window_size, self.window.get_size()
+
+    def time_to_next_tick(self):
+        # Milliseconds until the timer shows the next second
+        if not self.start_time or self.paused:
+            return 1000
+        fraction = (time.time() - self.start_time) % 1
+        return max(1, int((1 - fraction) * 1000) + 1)
+
+    def glyph(self, num, color):
+        key = (num, color)
+        surface = self.glyphs.get(key)
+        if surface is None:
+            surface = self.glyphs[key] = self.digit_font.render(SYMBOLS[num - 1], True, color)
+        return surface
+
+    def pencil_glyph(self, num):
+        key = ('pencil', num)
+        surface = self.glyphs.get(key)
+        if surface is None:
+            surface = self.glyphs[key] = self.pencil_font.render(SYMBOLS[num - 1], True, (120, 120, 120))
+        return surface
 
     def draw_grid(self):
         bg_color = self.themes[self.current_theme]['bg_color']
-        grid_color = self.themes[self.current_theme]['grid_color']
         self.window.fill(bg_color)
-        for i in range(10):
-            thickness = 4 if i % 3 == 0 else 1
+        self.draw_grid_lines()
+
+    def draw_grid_lines(self):
+        grid_color = self.themes[self.current_theme]['grid_color']
+        for i in range(self.side + 1):
+            thickness = 4 if i % self.base == 0 else 1
             pygame.draw.line(self.window, grid_color, (0, i * self.cell_size), (self.window_size, i * self.cell_size), thickness)
             pygame.draw.line(self.window, grid_color, (i * self.cell_size, 0), (i * self.cell_size, self.window_size), thickness)
 
-    def draw_numbers(self):
-        for row in range(9):
-            for col in range(9):
-                num = self.board[row][col]
-                if num != 0:
-                    if self.original_puzzle[row][col] != 0:
-                        color = (0, 0, 0)  # Original numbers in black
-                    else:
-                        if num != self.solution[row][col]:
-                            color = (255, 0, 0)  # Incorrect entries in red
-                        else:
-                            color = (0, 0, 255)  # Correct user input in blue
-                    text = self.font.render(str(num), True, color)
-                    x = col * self.cell_size + (self.cell_size - text.get_width()) // 2
-                    y = row * self.cell_size + (self.cell_size - text.get_height()) // 2
+    def cell_state(self, row, col):
+        # Everything that decides how a cell looks: (number, color, selected,
+        # conflict, pencil marks)
+        num = self.board[row][col]
+        color = None
+        conflict = False
+        marks = 0
+        if num == 0:
+            if self.show_candidates:
+                marks = self.candidates(row, col)
+        else:
+            conflict = self.in_conflict(row, col)
+            if self.original_puzzle[row][col] != 0:
+                color = (0, 0, 0)  # Original numbers in black
+            elif num != self.solution[row][col]:
+                color = (255, 0, 0)  # Incorrect entries in red
+            else:
+                color = (0, 0, 255)  # Correct user input in blue
+        return num, color, self.selected_cell == (row, col), conflict, marks
+
+    def draw_cell(self, row, col, state):
+        num, color, selected, conflict, marks = state
+        rect = pygame.Rect(col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size)
+        self.window.set_clip(rect)
+        # Cells whose digit breaks a rule get a red background
+        conflict_color = (255, 200, 200) if self.current_theme == 'default' else (110, 40, 40)
+        self.window.fill(conflict_color if conflict else self.themes[self.current_theme]['bg_color'], rect)
+        self.draw_grid_lines()
+        if num != 0:
+            text = self.glyph(num, color)
+            x = rect.x + (self.cell_size - text.get_width()) // 2
+            y = rect.y + (self.cell_size - text.get_height()) // 2
+            self.window.blit(text, (x, y))
+        elif marks:
+            # Candidates in a base x base grid, each digit in its own spot
+            spot = self.cell_size / self.base
+            for d in range(self.side):
+                if marks >> d & 1:
+                    text = self.pencil_glyph(d + 1)
+                    x = rect.x + int((d % self.base + 0.5) * spot) - text.get_width() // 2
+                    y = rect.y + int((d // self.base + 0.5) * spot) - text.get_height() // 2
                     self.window.blit(text, (x, y))
+        if selected:
+            pygame.draw.rect(self.window, (255, 0, 0), rect, 3)
+        self.window.set_clip(None)
+        return rect
 
-    def draw_selection(self):
-        if self.selected_cell:
-            row, col = self.selected_cell
-            pygame.draw.rect(
-                self.window,
-                (255, 0, 0),
-                (col * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size),
-                3,
-            )
-
-    def draw_message(self):
-        # Display messages
-        if self.message:
-            text = self.small_font.render(self.message, True, (255, 0, 0))
-            self.window.blit(text, (10, self.window_size + 10))
-        # Display timer
+    def status_state(self):
+        timer = None
         if self.start_time:
             elapsed_time = int(time.time() - self.start_time)
             minutes = elapsed_time // 60
             seconds = elapsed_time % 60
-            timer_text = self.small_font.render(f"Time: {minutes:02d}:{seconds:02d}", True, (0, 0, 0))
+            timer = f"Time: {minutes:02d}:{seconds:02d}"
+        return self.message, timer, self.hints_available
+
+    def draw_message(self, status):
+        message, timer, hints = status
+        width, height = self.window.get_size()
+        rect = pygame.Rect(0, self.window_size + 3, width, height - self.window_size - 3)
+        self.window.fill(self.themes[self.current_theme]['bg_color'], rect)
+        # Display messages
+        if message:
+            text = self.small_font.render(message, True, (255, 0, 0))
+            self.window.blit(text, (10, self.window_size + 10))
+        # Display timer
+        if timer:
+            timer_text = self.small_font.render(timer, True, (0, 0, 0))
             self.window.blit(timer_text, (self.window_size - 150, self.window_size + 10))
         # Display hints left
-        hints_text = self.small_font.render(f"Hints Left: {self.hints_available}", True, (0, 0, 0))
+        hints_text = self.small_font.render(f"Hints Left: {hints}", True, (0, 0, 0))
         self.window.blit(hints_text, (10, self.window_size + 30))
+        return rect
+
+    def wait_for_puzzle(self, fetch):
+        # Keep the window responsive until fetch() returns a puzzle.
+        # Returns None if the player closes the window while waiting.
+        text = self.small_font.render("Generating puzzle...", True, self.themes[self.current_theme]['grid_color'])
+        while True:
+            picked = fetch()
+            if picked:
+                return picked
+            self.window.fill(self.themes[self.current_theme]['bg_color'])
+            self.window.blit(text, (self.window_size // 2 - text.get_width() // 2, self.window_size // 2))
+            self.session.flip()
+            self.clock.tick(30)
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                    self.play_again = False
+                    return None
+
+    def draw_overlay(self):
+        stats = self.generation_stats
+        lines = [f"frame {self.frame_time * 1000:.1f} ms  render {self.render_time * 1000:.2f} ms"]
+        if 'seconds' in stats:
+            lines.append(f"generated in {stats['seconds'] * 1000:.1f} ms, {stats['clues']} clues")
+            lines.append(f"removals: {stats['accepted_removals']} accepted, {stats['rejected_removals']} rejected")
+            if 'nodes' in stats:
+                lines.append(f"nodes {stats['nodes']}  backtracks {stats['backtracks']}  "
+                             f"propagations {stats['propagations']}")
+                lines.append(f"slowest removal check {stats['max_removal_seconds'] * 1000:.2f} ms")
+        else:
+            lines.append("no generation stats for this puzzle")
+        if self.seed_id:
+            lines.append(f"puzzle {self.seed_id}")
+        rect = pygame.Rect(0, 0, min(self.window_size, 420), 8 + 22 * len(lines))
+        self.window.fill((0, 0, 0), rect)
+        for n, line in enumerate(lines):
+            text = self.small_font.render(line, True, (255, 255, 255))
+            self.window.blit(text, (6, 4 + 22 * n))
+        return rect
 
     def draw_pause_screen(self):
         self.window.fill((100, 100, 100))
         pause_text = self.font.render("Paused", True, (255, 255, 255))
         self.window.blit(pause_text, (self.window_size // 2 - pause_text.get_width() // 2, self.window_size // 2))
-        pygame.display.flip()
+        self.session.flip()
 
     def select_cell(self, pos):
         x, y = pos
-        if x < self.window_size and y < self.window_size:
+        if x < self.cell_size * self.side and y < self.cell_size * self.side:
             col = x // self.cell_size
             row = y // self.cell_size
             self.selected_cell = (row, col)
             self.message = ""
-            self.select_sound.play()
+            self.session.sound('select').play()
         else:
             self.selected_cell = None
 
@@ -284,13 +521,15 @@ class SudokuGUI:
             row, col = self.selected_cell
             if self.original_puzzle[row][col] == 0 and self.board[row][col] != 0:
                 self.moves.append((self.selected_cell, self.board[row][col]))  # Save move for undo
-                self.board[row][col] = 0
+                self.record(journal.MOVE, row, col, self.board[row][col], 0)
+                self.set_cell(row, col, 0)
 
     def undo_move(self):
         if self.moves:
             last_move = self.moves.pop()
             row, col = last_move[0]
-            self.board[row][col] = last_move[1]  # Restore the last value
+            self.record(journal.UNDO, row, col, self.board[row][col], last_move[1])
+            self.set_cell(row, col, last_move[1])  # Restore the last value
             self.message = "Move undone."
 
     def give_hint(self):
@@ -298,7 +537,8 @@ class SudokuGUI:
             row, col = self.selected_cell
             if self.board[row][col] == 0:
                 correct_num = self.solution[row][col]
-                self.board[row][col] = correct_num
+                self.record(journal.HINT, row, col, 0, correct_num)
+                self.set_cell(row, col, correct_num)
                 self.hints_available -= 1
                 self.message = f"Hint used. Hints left: {self.hints_available}"
             else:
@@ -309,63 +549,171 @@ class SudokuGUI:
     def is_valid_move(self, num, row, col):
         return num == self.solution[row][col]
 
+    def track_board(self):
+        # Rebuild the unit counts and masks from the whole board
+        side = self.side
+        self.row_counts = [[0] * (side + 1) for _ in range(side)]
+        self.col_counts = [[0] * (side + 1) for _ in range(side)]
+        self.box_counts = [[0] * (side + 1) for _ in range(side)]
+        self.row_masks = [0] * side
+        self.col_masks = [0] * side
+        self.box_masks = [0] * side
+        self.filled = 0
+        for row in range(side):
+            for col in range(side):
+                if self.board[row][col]:
+                    self.add_digit(row, col, self.board[row][col])
+
+    def box_index(self, row, col):
+        return (row // self.base) * self.base + col // self.base
+
+    def add_digit(self, row, col, num):
+        bit = 1 << (num - 1)
+        box = self.box_index(row, col)
+        self.row_counts[row][num] += 1
+        self.col_counts[col][num] += 1
+        self.box_counts[box][num] += 1
+        self.row_masks[row] |= bit
+        self.col_masks[col] |= bit
+        self.box_masks[box] |= bit
+        self.filled += 1
+
+    def remove_digit(self, row, col, num):
+        bit = 1 << (num - 1)
+        box = self.box_index(row, col)
+        self.row_counts[row][num] -= 1
+        self.col_counts[col][num] -= 1
+        self.box_counts[box][num] -= 1
+        if not self.row_counts[row][num]:
+            self.row_masks[row] &= ~bit
+        if not self.col_counts[col][num]:
+            self.col_masks[col] &= ~bit
+        if not self.box_counts[box][num]:
+            self.box_masks[box] &= ~bit
+        self.filled -= 1
+
+    def set_cell(self, row, col, num):
+        # Every single-cell change goes through here to keep the counts right
+        old = self.board[row][col]
+        if old:
+            self.remove_digit(row, col, old)
+        if num:
+            self.add_digit(row, col, num)
+        self.board[row][col] = num
+
+    def in_conflict(self, row, col):
+        # True if the digit at (row, col) repeats in its row, column or box
+        num = self.board[row][col]
+        return bool(num) and (self.row_counts[row][num] > 1 or self.col_counts[col][num] > 1
+                              or self.box_counts[self.box_index(row, col)][num] > 1)
+
+    def candidates(self, row, col):
+        # Bitmask of digits the rules still allow in (row, col)
+        used = self.row_masks[row] | self.col_masks[col] | self.box_masks[self.box_index(row, col)]
+        return ~used & ((1 << self.side) - 1)
+
     def is_puzzle_complete(self):
-        for row in self.board:
-            if 0 in row:
-                return False
-        return True
+        return self.filled == self.side * self.side
 
     def reset_puzzle(self):
         self.board = [row[:] for row in self.original_puzzle]
+        self.track_board()
         self.moves.clear()
         self.selected_cell = None
         self.message = "Puzzle reset"
         self.start_time = time.time()
         self.hints_available = 3
+        self.record(journal.RESET)
 
     def solve_puzzle(self):
+        self.record(journal.SOLVE)
         self.board = [row[:] for row in self.solution]
+        self.track_board()
         self.message = "Puzzle solved!"
-        self.success_sound.play()
+        self.session.sound('success').play()
+
+    def elapsed(self):
+        # Seconds played, not counting time spent paused
+        now = self.pause_start_time if self.paused else time.time()
+        return now - self.start_time
+
+    def record(self, kind, row=0, col=0, old=0, new=0):
+        if self.journal:
+            self.journal.append(kind, row, col, old, new, self.elapsed())
 
     def save_game(self):
-        with open('savegame.pkl', 'wb') as f:
-            pickle.dump({
-                'board': self.board,
-                'moves': self.moves,
-                'start_time': self.start_time,
-                'hints_available': self.hints_available,
-                'selected_cell': self.selected_cell,
-                'difficulty': self.difficulty,
-                'original_puzzle': self.original_puzzle,
-                'solution': self.solution,
-                'current_theme': self.current_theme
-            }, f)
-        self.message = "Game saved."
-
-    def load_game(self):
-        try:
-            with open('savegame.pkl', 'rb') as f:
-                data = pickle.load(f)
-                self.board = data['board']
-                self.moves = data['moves']
-                self.start_time = data['start_time']
-                self.hints_available = data['hints_available']
-                self.selected_cell = data['selected_cell']
-                self.difficulty = data['difficulty']
-                self.original_puzzle = data['original_puzzle']
-                self.solution = data['solution']
-                self.current_theme = data.get('current_theme', 'default')
-            self.message = "Game loaded."
-        except FileNotFoundError:
-            self.message = "No saved game found."
+        # The autosave is always current, so saving copies it to the slot
+        if self.journal:
+            self.journal.save_as(journal.slot_path(self.save_slot))
+            self.message = f"Game saved to slot {self.save_slot}."
+
+    def load_game(self, slot):
+        loaded = journal.load(journal.slot_path(slot), journal.slot_path(0))
+        if not loaded:
+            self.message = "No saved game found." if slot == 0 else f"No saved game in slot {slot}."
+            return
+        if self.journal:
+            self.journal.close()
+        self.journal = loaded
+        state = loaded.state
+        self.difficulty = loaded.difficulty
+        self.original_puzzle = loaded.puzzle
+        self.seed_id = loaded.seed_id
+        self.solution = loaded.solution
+        self.board = [row[:] for row in state['board']]  # The journal keeps its own copy
+        self.moves = [((row, col), old) for row, col, old in state['moves']]
+        self.hints_available = state['hints']
+        self.start_time = time.time() - state['elapsed']
+        self.set_board_size(len(self.board))
+        self.track_board()
+        self.selected_cell = None
+        self.paused = False
+        self.pause_start_time = None
+        self.drawn_cells = None
+        self.message = "Game loaded." if slot == 0 else f"Game loaded from slot {slot}."
 
     def save_completion_time(self):
-        elapsed_time = int(time.time() - self.start_time)
-        self.high_scores.setdefault(self.difficulty, []).append(elapsed_time)
-        self.high_scores[self.difficulty] = sorted(self.high_scores[self.difficulty])[:5]  # Keep top 5
-        self.save_high_scores()
+        if self.leaderboard:
+            self.leaderboard.add(self.difficulty, self.side, round(self.elapsed(), 1), hints=3 - self.hints_available,
+                                 puzzle=puzzle_id(self.original_puzzle, self.seed_id))
 
     def display_leaderboard(self):
-        # Implement a method to display the leaderboard
-        pass  # For brevity, the code for this method is not included
+        # Best times for this board size, one column per difficulty, until a
+        # key is pressed
+        difficulties = ('easy', 'medium', 'hard')
+        text_color = (0, 0, 0) if self.current_theme == 'default' else (200, 200, 200)
+        self.window.fill(self.themes[self.current_theme]['bg_color'])
+        title = self.font.render(f"Leaderboard {self.side}x{self.side}", True, text_color)
+        self.window.blit(title, (self.window_size // 2 - title.get_width() // 2, 20))
+        column = self.window_size // len(difficulties)
+        for n, difficulty in enumerate(difficulties):
+            x = n * column + 20
+            count = self.leaderboard.count(difficulty, self.side)
+            heading = self.small_font.render(f"{difficulty.capitalize()} ({count})", True, text_color)
+            self.window.blit(heading, (x, 90))
+            for rank, (seconds, hints, finished) in enumerate(self.leaderboard.top(difficulty, self.side), 1):
+                minutes, seconds = divmod(int(seconds), 60)
+                line = f"{rank}. {minutes}:{seconds:02d}"
+                if hints:
+                    line += f" ({hints}h)"
+                self.window.blit(self.small_font.render(line, True, text_color), (x, 100 + 26 * rank))
+        if self.original_puzzle:
+            best = self.leaderboard.best(puzzle_id(self.original_puzzle, self.seed_id))
+            if best is not None:
+                minutes, seconds = divmod(int(best), 60)
+                text = self.small_font.render(f"Best on this puzzle: {minutes}:{seconds:02d}", True, text_color)
+                self.window.blit(text, (20, self.window_size - 20))
+        hint = self.small_font.render("Press any key to return", True, text_color)
+        self.window.blit(hint, (self.window_size // 2 - hint.get_width() // 2, self.window_size + 30))
+        self.session.flip()
+
+        waiting = True
+        while waiting:
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                self.running = False
+                self.play_again = False
+                waiting = False
+            elif event.type == pygame.KEYDOWN:
+                waiting = False
+        self.drawn_cells = None  # Repaint the whole game screen
@@ -0,0 +1,258 @@
+import json
+import os
+import shutil
+import struct
+import zlib
+
+from sudoku import SEED_ID, pack_seed_id, regenerate, unpack_seed_id
+
+# Append-only save file. A header holds the puzzle and solution once, or
+# just their seed id when they were generated from one; every action after
+# that is one fixed-size record, so saving a keystroke costs the same however
+# long the game has run. Every SNAPSHOT_EVERY records the replayed state is
+# written to a side file so loading only replays the tail.
+MAGIC = b'SDKJ'
+VERSION = 1  # Header followed by the puzzle and solution
+SEEDED_VERSION = 2  # Header followed by the packed seed id they regenerate from
+HEADER = struct.Struct('<4sBBB8s')  # magic, version, side, hints, difficulty
+RECORD = struct.Struct('<BBBBBxxxd')  # kind, row, col, old, new, elapsed seconds
+SNAPSHOT_EVERY = 256
+SLOTS = 9  # Manual save slots 1..SLOTS; slot 0 is the autosave
+
+# Record kinds
+MOVE, UNDO, HINT, PAUSE, RESUME, RESET, SOLVE = range(1, 8)
+
+
+def slot_path(slot):
+    return f'savegame-{slot}.journal'
+
+
+def snapshot_path(path):
+    return path + '.snap'
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def check_grid(grid, side):
+    # Save files are not trusted: ValueError unless grid is side x side
+    # numbers from 0 to side
+    if (not isinstance(grid, list) or len(grid) != side
+            or any(not isinstance(row, list) or len(row) != side for row in grid)
+            or any(type(num) is not int or not 0 <= num <= side for row in grid for num in row)):
+        raise ValueError("bad grid in save file")
+
+
+class Journal:
+    # An open save file, plus the game state its records add up to
+    def __init__(self, path, puzzle, solution, difficulty, hints, fsync=True, seed_id=None):
+        self.path = path
+        # Own copies: the caller's board changes as the game is played
+        self.puzzle = [row[:] for row in puzzle]
+        self.solution = [row[:] for row in solution]
+        self.difficulty = difficulty
+        self.hints = hints
+        self.side = len(puzzle)
+        self.fsync = fsync
+        self.seed_id = seed_id
+        self.header_size = HEADER.size + (SEED_ID.size if seed_id else 2 * self.side * self.side)
+        self.checksum = 0
+        self.records = 0
+        self.file = None
+        self.state = None
+        self.reset_state()
+
+    @classmethod
+    def create(cls, path, puzzle, solution, difficulty, hints=3, fsync=True, seed_id=None):
+        # Start a new save file at path, replacing any old one. A puzzle with
+        # a seed id is saved as just the id.
+        journal = cls(path, puzzle, solution, difficulty, hints, fsync, seed_id)
+        version = SEEDED_VERSION if seed_id else VERSION
+        header = HEADER.pack(MAGIC, version, journal.side, hints, difficulty.encode('ascii'))
+        if seed_id:
+            header += pack_seed_id(seed_id)
+        else:
+            header += bytes(num for row in puzzle for num in row)
+            header += bytes(num for row in solution for num in row)
+        journal.checksum = zlib.crc32(header)
+        try:
+            os.remove(snapshot_path(path))
+        except FileNotFoundError:
+            pass
+        journal.file = open(path, 'wb')
+        journal.file.write(header)
+        journal.sync()
+        return journal
+
+    @classmethod
+    def open(cls, path, fsync=True):
+        # Rebuild the state saved at path and reopen it for appending, or
+        # return None if the file is missing or not a save file
+        try:
+            f = open(path, 'r+b')
+        except OSError:
+            return None
+        try:
+            magic, version, side, hints, difficulty = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version not in (VERSION, SEEDED_VERSION):
+                raise ValueError(f"{path} is not a save file")
+            seed_id = None
+            if version == SEEDED_VERSION:
+                # Raises ValueError for an id from another generator version
+                seed_id = unpack_seed_id(f.read(SEED_ID.size))
+                puzzle, solution = regenerate(seed_id)
+                if len(puzzle) != side:
+                    raise ValueError(f"{path} does not match its puzzle")
+            elif side not in (4, 9, 16, 25):
+                raise ValueError(f"{path} has a bad board size")
+            else:
+                cells = side * side
+                grids = f.read(2 * cells)
+                if len(grids) != 2 * cells:
+                    raise ValueError(f"{path} is truncated")
+                puzzle = [list(grids[r * side:(r + 1) * side]) for r in range(side)]
+                solution = [list(grids[cells + r * side:cells + (r + 1) * side]) for r in range(side)]
+                check_grid(puzzle, side)
+                check_grid(solution, side)
+            journal = cls(path, puzzle, solution, difficulty.rstrip(b'\0').decode('ascii'), hints, fsync, seed_id)
+            f.seek(0)
+            journal.checksum = zlib.crc32(f.read(journal.header_size))
+            journal.load_snapshot()
+            f.seek(journal.header_size + journal.records * RECORD.size)
+            while True:
+                data = f.read(RECORD.size)
+                if len(data) < RECORD.size:
+                    break
+                journal.apply(*RECORD.unpack(data))
+                journal.records += 1
+            # Drop a record cut short by a crash so appends stay aligned
+            f.truncate(journal.header_size + journal.records * RECORD.size)
+        except (ValueError, struct.error):
+            f.close()
+            return None
+        journal.file = f
+        return journal
+
+    def reset_state(self):
+        self.state = {
+            'board': [row[:] for row in self.puzzle],
+            'moves': [],  # (row, col, value before the move) for undo
+            'hints': self.hints,
+            'elapsed': 0.0,
+        }
+
+    def apply(self, kind, row, col, old, new, elapsed):
+        # ValueError for a record that cannot belong to this game
+        side = self.side
+        if not MOVE <= kind <= SOLVE or row >= side or col >= side or old > side or new > side:
+            raise ValueError(f"bad record {(kind, row, col, old, new)}")
+        if kind in (MOVE, HINT) and self.puzzle[row][col]:
+            raise ValueError(f"record changes a given cell {(row, col)}")
+        state = self.state
+        board = state['board']
+        if kind == MOVE:
+            state['moves'].append((row, col, board[row][col]))
+            board[row][col] = new
+        elif kind == UNDO:
+            if state['moves']:
+                row, col, old = state['moves'].pop()
+                board[row][col] = old
+        elif kind == HINT:
+            board[row][col] = new
+            state['hints'] -= 1
+        elif kind == RESET:
+            self.reset_state()
+            state = self.state
+        elif kind == SOLVE:
+            state['board'] = [row[:] for row in self.solution]
+        state['elapsed'] = elapsed
+
+    def append(self, kind, row=0, col=0, old=0, new=0, elapsed=0.0):
+        self.apply(kind, row, col, old, new, elapsed)
+        self.file.write(RECORD.pack(kind, row, col, old, new, elapsed))
+        self.sync()
+        self.records += 1
+        if self.records % SNAPSHOT_EVERY == 0:
+            self.write_snapshot()
+
+    def sync(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def write_snapshot(self):
+        # Written beside the journal and moved into place once complete
+        path = snapshot_path(self.path)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'checksum': self.checksum, 'records': self.records, 'state': self.state}, f)
+        os.replace(path + '.tmp', path)
+
+    def load_snapshot(self):
+        # Start from the snapshot if it belongs to this journal; a stale or
+        # damaged one is ignored and everything is replayed instead
+        try:
+            with open(snapshot_path(self.path)) as f:
+                data = json.load(f)
+            if data['checksum'] != self.checksum:
+                return
+            records = data['records']
+            state = data['state']
+            size = os.path.getsize(self.path)
+            if type(records) is not int or not 0 <= records <= (size - self.header_size) // RECORD.size:
+                return
+            board = state['board']
+            moves = [tuple(move) for move in state['moves']]
+            check_grid(board, self.side)
+            if any(given and given != num for given_row, row in zip(self.puzzle, board)
+                   for given, num in zip(given_row, row)):
+                raise ValueError("snapshot changes a given cell")
+            for move in moves:
+                row, col, old = move
+                if any(type(v) is not int for v in move) or not (
+                        0 <= row < self.side and 0 <= col < self.side and 0 <= old <= self.side):
+                    raise ValueError("bad move in snapshot")
+            if type(state['hints']) is not int or not isinstance(state['elapsed'], (int, float)):
+                raise ValueError("bad snapshot")
+            self.state = {
+                'board': board,
+                'moves': moves,
+                'hints': state['hints'],
+                'elapsed': state['elapsed'],
+            }
+            self.records = records
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save_as(self, path):
+        # Copy this game to another slot; play continues in this one
+        self.file.flush()
+        copy(self.path, path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def copy(src, dst):
+    # Copy a journal and its snapshot, replacing whatever dst held
+    for src_path, dst_path in ((src, dst), (snapshot_path(src), snapshot_path(dst))):
+        if os.path.exists(src_path):
+            shutil.copyfile(src_path, dst_path + '.tmp')
+            os.replace(dst_path + '.tmp', dst_path)
+        elif os.path.exists(dst_path):
+            os.remove(dst_path)
+
+
+def load(path, into, fsync=True):
+    # Reopen the game saved at path for play in the journal at into, copying
+    # it there first. Returns the Journal, or None if nothing usable is saved
+    # at path, in which case into is left alone.
+    if path != into:
+        journal = Journal.open(path, fsync=False)
+        if journal is None:
+            return None
+        journal.close()
+        copy(path, into)
+    return Journal.open(into, fsync)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Every completed game, kept in SQLite. Writes go through a background thread
+# that commits them in batches, so recording a win never blocks the GUI;
+# reads are cached until the next batch lands.
+DEFAULT_PATH = 'leaderboard.db'
+LEGACY_PATH = 'high_scores.json'
+BATCH_SIZE = 256
+BATCH_WAIT = 0.5  # Seconds the writer waits for more rows before committing
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS completions (
+    id INTEGER PRIMARY KEY,
+    finished REAL,
+    difficulty TEXT NOT NULL,
+    side INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    hints INTEGER,
+    puzzle TEXT
+);
+CREATE INDEX IF NOT EXISTS completions_by_time ON completions (difficulty, side, seconds);
+CREATE INDEX IF NOT EXISTS completions_by_puzzle ON completions (puzzle, seconds);
+'''
+
+
+def puzzle_id(board, seed_id=None):
+    # Short stable id for a starting grid: its seed id when it was generated
+    # from one (see sudoku.seed_id), else a hash of the grid
+    if seed_id:
+        return seed_id
+    return hashlib.blake2b(bytes(num for row in board for num in row), digest_size=8).hexdigest()
+
+
+def legacy_rows(path=LEGACY_PATH):
+    # Rows from the old top-5 high_scores.json. Keys are a difficulty, with
+    # " NxN" appended for boards other than 9x9. Only the times were kept.
+    try:
+        with open(path) as f:
+            scores = json.load(f)
+    except (OSError, ValueError):
+        return []
+    rows = []
+    for key, times in scores.items():
+        difficulty, _, size = key.partition(' ')
+        side = int(size.split('x')[0]) if size else 9
+        rows.extend((None, difficulty, side, seconds, None, None) for seconds in times)
+    return rows
+
+
+class Leaderboard:
+    def __init__(self, path=DEFAULT_PATH, legacy_path=LEGACY_PATH):
+        self.path = path
+        self.rows = queue.Queue()
+        self.version = 0  # Bumped after each committed batch
+        self.cache = {}
+        created = not os.path.exists(path)
+        with sqlite3.connect(path) as db:
+            db.execute('PRAGMA journal_mode=WAL')  # Readers do not wait for the writer
+            db.executescript(SCHEMA)
+            if created and legacy_path:
+                db.executemany('INSERT INTO completions (finished, difficulty, side, seconds, hints, puzzle) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', legacy_rows(legacy_path))
+        db.close()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db_lock = threading.Lock()
+        self.writer = threading.Thread(target=self.write_rows, daemon=True)
+        self.writer.start()
+
+    def add(self, difficulty, side, seconds, hints=None, puzzle=None, finished=None):
+        # Queue one completion; returns at once
+        self.rows.put((finished or time.time(), difficulty, side, seconds, hints, puzzle))
+
+    def write_rows(self):
+        db = sqlite3.connect(self.path)
+        db.execute('PRAGMA synchronous=NORMAL')  # With WAL, a crash can only lose the last batch
+        while True:
+            row = self.rows.get()
+            batch = []
+            done = row is None
+            if not done:
+                batch.append(row)
+                deadline = time.monotonic() + BATCH_WAIT
+                while len(batch) < BATCH_SIZE:
+                    try:
+                        row = self.rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if row is None:
+                        done = True
+                        break
+                    batch.append(row)
+            if batch:
+                with db:
+                    db.executemany('INSERT INTO completions (finished, difficulty, side, seconds, hints, puzzle) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', batch)
+                self.version += 1
+            for _ in range(len(batch) + done):
+                self.rows.task_done()
+            if done:
+                db.close()
+                return
+
+    def flush(self):
+        # Wait until everything added so far is committed
+        self.rows.join()
+
+    def query(self, sql, args):
+        key = (sql, args)
+        cached = self.cache.get(key)
+        if cached and cached[0] == self.version:
+            return cached[1]
+        version = self.version
+        with self.db_lock:
+            result = self.db.execute(sql, args).fetchall()
+        self.cache[key] = (version, result)
+        return result
+
+    def top(self, difficulty, side=9, n=10):
+        # Fastest completions as (seconds, hints, finished), best first
+        return self.query('SELECT seconds, hints, finished FROM completions '
+                          'WHERE difficulty = ? AND side = ? ORDER BY seconds LIMIT ?',
+                          (difficulty, side, n))
+
+    def best(self, puzzle):
+        # Best time on one puzzle, or None if it has not been finished
+        rows = self.query('SELECT MIN(seconds) FROM completions WHERE puzzle = ?', (puzzle,))
+        return rows[0][0]
+
+    def count(self, difficulty, side=9):
+        return self.query('SELECT COUNT(*) FROM completions WHERE difficulty = ? AND side = ?',
+                          (difficulty, side))[0][0]
+
+    def close(self):
+        if self.writer.is_alive():
+            self.rows.put(None)
+            self.writer.join()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,18 +1,100 @@
-from sudoku import Sudoku
+import time
+
+STARTED = time.perf_counter()  # Before the imports below, for --startup-time
+
+import argparse
 from gui import SudokuGUI
+from bank import PuzzleBank
+from leaderboard import Leaderboard
+from prefetch import PuzzlePrefetcher
+from session import GameSession
+from sudoku import parse_seed_id, regenerate
+
+IMPORTED = time.perf_counter()
+PREFETCH_DEPTH = 2  # Puzzles kept ready per difficulty when there is no bank
+
+def report_startup(gui, session, leaderboard):
+    # Time to the first start screen, then to the start screen of a new game
+    gui.draw_start_screen()
+    first_frame = session.first_frame
+    start = time.perf_counter()
+    again = SudokuGUI(session, leaderboard)
+    again.set_board_size(gui.side)
+    again.draw_start_screen()
+    next_game = time.perf_counter() - start
+    print(f"imports: {(IMPORTED - STARTED) * 1000:.1f} ms")
+    print(f"first frame: {first_frame * 1000:.1f} ms")
+    print(f"next game: {next_game * 1000:.1f} ms")
 
 def main():
+    parser = argparse.ArgumentParser(description="Play Sudoku.")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="show the start screen, print how long it took to appear and exit")
+    parser.add_argument('--puzzle', metavar='ID',
+                        help="start with the puzzle of this seed id, as shown in the F3 overlay")
+    args = parser.parse_args()
+    if args.puzzle:
+        try:
+            regenerate(args.puzzle)  # Checks the id; the game gets it from the cache
+        except ValueError as error:
+            parser.error(str(error))
+    shared = args.puzzle
+    # pygame, the window, fonts and sounds live for the whole run
+    session = GameSession(started=STARTED)
+    bank = PuzzleBank.open()  # None if no bank has been built
+    leaderboard = Leaderboard()
+    # One prefetcher per board size. For 9x9, generate ahead only for
+    # difficulties the bank cannot serve; other sizes start on first use.
+    prefetchers = {}
+    missing = [d for d in ('easy', 'medium', 'hard') if not bank or not bank.count(d)]
+    if missing:
+        prefetchers[3] = PuzzlePrefetcher(missing, depth=PREFETCH_DEPTH)
+    base = 3
     play_again = True
     while play_again:
-        gui = SudokuGUI()
-        gui.start_screen()
-        if not gui.play_again:
+        gui = SudokuGUI(session, leaderboard)
+        gui.set_board_size(base * base)
+        if args.startup_time:
+            report_startup(gui, session, leaderboard)
             break
-        difficulty = gui.difficulty
-        sudoku = Sudoku()
-        puzzle, solution = sudoku.generate_puzzle(difficulty=difficulty)
-        gui.run(puzzle, solution)
+        seed_id = None
+        if shared:
+            # A shared puzzle skips the start screen for the first game
+            puzzle, solution = regenerate(shared)
+            seed_id, shared = shared, None
+            gui.difficulty = parse_seed_id(seed_id)[2]
+            base = int(round(len(puzzle) ** 0.5))
+            gui.generation_stats = {}
+        else:
+            gui.start_screen()
+            if not gui.play_again:
+                break
+            difficulty = gui.difficulty
+            base = gui.base
+            if gui.resume_game:
+                puzzle, solution = None, None  # Continue the autosaved game
+                gui.generation_stats = {}
+            elif bank and bank.side == gui.side and bank.count(difficulty):
+                puzzle, solution = bank.random_puzzle(difficulty)
+                gui.generation_stats = {}
+            else:
+                if base not in prefetchers:
+                    prefetchers[base] = PuzzlePrefetcher((), depth=PREFETCH_DEPTH, base=base)
+                prefetcher = prefetchers[base]
+                picked = gui.wait_for_puzzle(lambda: prefetcher.get(difficulty))
+                if not picked:
+                    break
+                puzzle, solution = picked
+                gui.generation_stats = prefetcher.last_stats
+                seed_id = prefetcher.last_stats.get('seed_id')
+        gui.run(puzzle, solution, seed_id)
         play_again = gui.play_again
+    for prefetcher in prefetchers.values():
+        prefetcher.close()
+    if bank:
+        bank.close()
+    leaderboard.close()
+    session.close()
 
 if __name__ == "__main__":
     main()
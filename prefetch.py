@@ -0,0 +1,51 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sudoku import Sudoku, seed_id
+
+
+class PuzzlePrefetcher:
+    # Keeps up to `depth` puzzles per difficulty generated ahead of time in
+    # worker processes, so taking one never waits on the solver. Difficulties
+    # not listed up front start being prefetched on first use.
+    def __init__(self, difficulties=('easy', 'medium', 'hard'), depth=2, workers=1, seed=None, base=3):
+        self.depth = depth
+        self.sudoku = Sudoku(base, seed=seed)
+        self.ready = {difficulty: deque() for difficulty in difficulties}
+        self.pending = {difficulty: deque() for difficulty in difficulties}
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.last_stats = {}  # generation_stats of the puzzle last handed out
+        self.fill()
+
+    def fill(self):
+        # Move finished puzzles to the ready queues and top up the work
+        for difficulty, pending in self.pending.items():
+            while pending and pending[0].done():
+                self.ready[difficulty].append(pending.popleft().result())
+            while len(self.ready[difficulty]) + len(pending) < self.depth:
+                seed = self.sudoku.random.getrandbits(64)
+                pending.append(self.pool.submit(_generate, self.sudoku.base, difficulty, seed))
+
+    def get(self, difficulty):
+        # A ready (puzzle, solution) pair, or None if none is finished yet
+        if difficulty not in self.ready:
+            self.ready[difficulty] = deque()
+            self.pending[difficulty] = deque()
+        self.fill()
+        if not self.ready[difficulty]:
+            return None
+        puzzle, solution, self.last_stats = self.ready[difficulty].popleft()
+        self.fill()
+        return puzzle, solution
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _generate(base, difficulty, seed):
+    # Process pool task; instrumentation is cheap next to the carve itself
+    sudoku = Sudoku(base, seed=seed)
+    sudoku.instrument = True
+    puzzle, solution = sudoku.generate_puzzle(difficulty)
+    stats = dict(sudoku.generation_stats, seed_id=seed_id(seed, difficulty, base))
+    return puzzle, solution, stats
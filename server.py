@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bank import PuzzleBank
+from cli import Engine, format_board, parse_line
+from grader import LEVELS
+from solver import SearchLimitReached
+from sudoku import Sudoku, seed_id
+
+# HTTP/JSON puzzle service. Requests are parsed on the event loop; solver
+# work is grouped into small batches and run on a process pool. Once too many
+# requests are waiting, new ones get 503 instead of queueing without bound.
+#
+#   POST /generate  {"difficulty": "medium", "size": 9, "grade": null}
+#                   -> {"puzzle": ..., "solution": ..., "id": seed id or null}
+#   POST /solve     {"puzzle": ...} -> {"solution": ... or null}
+#   POST /validate  {"puzzle": ...} -> {"status": "unique" | "multiple" | "unsolvable"}
+#   POST /hint      {"puzzle": ..., "board": ...} -> {"row", "col", "value", "mistake"}
+#   GET  /stats     counters for monitoring
+#
+# Solves for /solve, /validate and /hint stop after REQUEST_NODES search
+# nodes and answer 422, so a pathological board cannot hold a worker.
+# Boards use the one-line format of the command line tools.
+MAX_BODY = 64 * 1024
+MAX_HEADER = 8 * 1024
+REQUEST_NODES = 100000  # About 1.5 s on an empty 25x25 board, far above any real puzzle
+READY_DEPTH = 8  # Puzzles kept generated ahead per kind when the bank has none
+DIFFICULTIES = ('easy', 'medium', 'hard')
+SIZES = (4, 9, 16, 25)
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+_engine = Engine()
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _hint(puzzle, board):
+    # A wrong entry if there is one, else the empty cell with the fewest
+    # candidates and its solution digit
+    sudoku = _engine.sudoku(puzzle)
+    solution = sudoku.solve(puzzle)
+    if solution is None:
+        return {'error': 'puzzle has no solution'}
+    side = len(puzzle)
+    for r in range(side):
+        for c in range(side):
+            if board[r][c] and board[r][c] != solution[r][c]:
+                return {'row': r, 'col': c, 'value': solution[r][c], 'mistake': True}
+    solver = sudoku.solver
+    state = solver.load(board)
+    best = None
+    for i in range(solver.size):
+        if not state[0][i]:
+            count = bin(solver.candidates(state, i)).count('1')
+            if best is None or count < best[0]:
+                best = (count, i)
+    if best is None:
+        return {'row': None, 'col': None, 'value': None, 'mistake': False}
+    r, c = divmod(best[1], side)
+    return {'row': r, 'col': c, 'value': solution[r][c], 'mistake': False}
+
+
+def _run_batch(command, key, payloads):
+    # Process pool task: one batch of requests of the same kind
+    if command == 'generate':
+        base, difficulty, grade = key
+        results = []
+        for seed in payloads:
+            puzzle, solution = Sudoku(base, seed=seed).generate_puzzle(difficulty, grade)
+            results.append({'puzzle': format_board(puzzle), 'solution': format_board(solution),
+                            'id': seed_id(seed, difficulty, base, grade)})
+        return results
+    results = []
+    for payload in payloads:
+        puzzle = payload['puzzle']
+        sudoku = _engine.sudoku(puzzle)
+        solver = sudoku.solver
+        solver.max_nodes = solver.nodes + REQUEST_NODES
+        try:
+            if command == 'solve':
+                solution = sudoku.solve(puzzle)
+                results.append({'solution': format_board(solution) if solution else None})
+            elif command == 'validate':
+                count = sudoku.count_solutions(puzzle)
+                results.append({'status': {0: 'unsolvable', 1: 'unique'}.get(count, 'multiple')})
+            else:
+                results.append(_hint(puzzle, payload['board']))
+        except SearchLimitReached:
+            results.append({'error': "puzzle not settled within the search limit", 'code': 422})
+        finally:
+            solver.max_nodes = None
+    return results
+
+
+class PuzzleServer:
+    def __init__(self, workers=None, batch_size=32, batch_wait=0.005, max_queue=256, bank=None, seed=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_queue = max_queue
+        self.bank = bank
+        self.random = random.Random(seed)
+        self.batches = {}  # (command, key) -> [(payload, future)]
+        self.ready = {}  # (base, difficulty, grade) -> deque of generated puzzles
+        self.refilling = set()
+        self.pending = 0  # Requests waiting on the pool
+        self.stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'limited': 0, 'batches': 0, 'batched': 0,
+                      'bank_hits': 0, 'ready_hits': 0}
+
+    def submit(self, command, key, payload):
+        # Queue payload for the next batch of its kind; returns a future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self.batches.setdefault((command, key), [])
+        batch.append((payload, future))
+        if len(batch) >= self.batch_size:
+            self.flush(command, key)
+        elif len(batch) == 1:
+            loop.call_later(self.batch_wait, self.flush, command, key)
+        return future
+
+    def flush(self, command, key):
+        batch = self.batches.pop((command, key), None)
+        if batch:
+            asyncio.ensure_future(self.run_batch(command, key, batch))
+
+    async def run_batch(self, command, key, batch):
+        self.stats['batches'] += 1
+        self.stats['batched'] += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.pool, _run_batch, command, key, [p for p, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def compute(self, command, key, payload):
+        if self.pending >= self.max_queue:
+            raise RequestError(503, "server overloaded, retry later")
+        self.pending += 1
+        try:
+            return await self.submit(command, key, payload)
+        finally:
+            self.pending -= 1
+
+    async def generate(self, body):
+        difficulty = body.get('difficulty', 'medium')
+        size = body.get('size', 9)
+        grade = body.get('grade')
+        if difficulty not in DIFFICULTIES or size not in SIZES or grade not in LEVELS + (None,):
+            raise RequestError(400, "bad difficulty, size or grade")
+        base = int(round(size ** 0.5))
+        if self.bank and grade is None and self.bank.side == size and self.bank.count(difficulty):
+            self.stats['bank_hits'] += 1
+            puzzle, solution = self.bank.random_puzzle(difficulty, self.random)
+            return {'puzzle': format_board(puzzle), 'solution': format_board(solution), 'id': None}
+        key = (base, difficulty, grade)
+        ready = self.ready.setdefault(key, deque())
+        if ready:
+            self.stats['ready_hits'] += 1
+            result = ready.popleft()
+        else:
+            result = await self.compute('generate', key, self.random.getrandbits(64))
+        self.refill(key)
+        return result
+
+    def refill(self, key):
+        # Top up the ready puzzles of one kind in the background, only while
+        # the pool has room to spare
+        if key in self.refilling or self.pending >= self.max_queue // 2:
+            return
+        self.refilling.add(key)
+        asyncio.ensure_future(self.fill(key))
+
+    async def fill(self, key):
+        ready = self.ready.setdefault(key, deque())
+        wanted = min(READY_DEPTH - len(ready), self.max_queue // 2 - self.pending)
+        try:
+            results = await asyncio.gather(
+                *(self.compute('generate', key, self.random.getrandbits(64)) for _ in range(wanted)),
+                return_exceptions=True)
+            ready.extend(r for r in results if not isinstance(r, BaseException))
+        finally:
+            self.refilling.discard(key)
+
+    def board(self, body, name, required=True):
+        line = body.get(name)
+        if line is None and not required:
+            return None
+        if not isinstance(line, str):
+            raise RequestError(400, f"missing {name!r}")
+        try:
+            return parse_line(line)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+
+    async def dispatch(self, method, path, body):
+        if path == '/stats':
+            if method != 'GET':
+                raise RequestError(405, "use GET")
+            return dict(self.stats, pending=self.pending,
+                        ready={f"{b * b}x{b * b} {d} {g or '-'}": len(q)
+                               for (b, d, g), q in self.ready.items()})
+        if path not in ('/generate', '/solve', '/validate', '/hint'):
+            raise RequestError(404, f"no endpoint {path}")
+        if method != 'POST':
+            raise RequestError(405, "use POST")
+        try:
+            body = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError(400, "body is not JSON")
+        if not isinstance(body, dict):
+            raise RequestError(400, "body must be a JSON object")
+        command = path[1:]
+        if command == 'generate':
+            return await self.generate(body)
+        puzzle = self.board(body, 'puzzle')
+        payload = {'puzzle': puzzle}
+        if command == 'hint':
+            board = self.board(body, 'board', required=False) or puzzle
+            if len(board) != len(puzzle):
+                raise RequestError(400, "board and puzzle sizes differ")
+            payload['board'] = board
+        result = await self.compute(command, None, payload)
+        if 'error' in result:
+            # An unsolvable puzzle for /hint, or a search over REQUEST_NODES
+            if result.get('code') == 422:
+                self.stats['limited'] += 1
+            raise RequestError(result.get('code', 400), result['error'])
+        return result
+
+    async def handle(self, reader, writer):
+        # One connection; requests are answered in order while it stays open
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, {'error': "headers too large"}, False)
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "bad request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "bad Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': "body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                self.stats['requests'] += 1
+                try:
+                    status, result = 200, await self.dispatch(method, path.split('?')[0], body)
+                except RequestError as e:
+                    status, result = e.status, {'error': str(e)}
+                    if status == 503:
+                        self.stats['rejected'] += 1
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    status, result = 500, {'error': f"{type(e).__name__}: {e}"}
+                await self.respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, result, keep_alive):
+        body = json.dumps(result).encode()
+        head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER)
+        # Have puzzles ready for the common requests the bank cannot answer
+        for difficulty in DIFFICULTIES:
+            if not (self.bank and self.bank.side == 9 and self.bank.count(difficulty)):
+                self.refill((3, difficulty, None))
+        print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+        # Stop cleanly on SIGTERM as well as Ctrl+C so the pool is shut down
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+            except (NotImplementedError, RuntimeError):
+                pass  # Not on this platform; Ctrl+C still raises KeyboardInterrupt
+        async with server:
+            await stop
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Sudoku puzzles over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help="solver processes")
+    parser.add_argument('--batch-size', type=int, default=32, help="most requests per pool task")
+    parser.add_argument('--batch-wait', type=float, default=0.005, help="seconds to wait for a batch to fill")
+    parser.add_argument('--max-queue', type=int, default=256, help="waiting requests before answering 503")
+    parser.add_argument('--bank', default='puzzles.bank', help="puzzle bank to serve from if present")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    bank = PuzzleBank.open(args.bank)
+    server = PuzzleServer(args.workers, args.batch_size, args.batch_wait, args.max_queue, bank, args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if bank:
+            bank.close()
+
+
+if __name__ == '__main__':
+    main()
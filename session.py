@@ -0,0 +1,71 @@
+import os
+import time
+
+# What the game sets up once per run rather than once per game: pygame, the
+# window, fonts and sounds. Fonts and sounds are loaded the first time they
+# are asked for and kept. pygame itself is only imported when a session
+# starts, so headless tools can import this module for free.
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOUNDS = {'select': 'select.wav', 'error': 'error.wav', 'success': 'success.wav'}
+FONT = 'arial'
+STATUS_HEIGHT = 80  # Below the board: messages, timer and hints
+
+
+class Silent:
+    # Stands in for a sound when there is no audio device
+    def play(self):
+        pass
+
+
+class GameSession:
+    def __init__(self, window_size=600, started=None):
+        # started: perf_counter() reading to measure startup from
+        self.started = time.perf_counter() if started is None else started
+        self.first_frame = None  # Seconds from started to the first frame shown
+        import pygame
+        self.pygame = pygame
+        # Only what the start screen needs; audio starts with the first sound
+        pygame.display.init()
+        pygame.font.init()
+        self.window_size = window_size
+        self.window = pygame.display.set_mode((window_size, window_size + STATUS_HEIGHT), pygame.RESIZABLE)
+        pygame.display.set_caption("Sudoku")
+        self.theme = 'default'  # Kept from one game to the next
+        self.fonts = {}
+        self.sounds = {}
+        self.audio = None  # Unknown until the first sound is asked for
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = self.pygame.font.SysFont(FONT, size)
+        return font
+
+    def sound(self, name):
+        sound = self.sounds.get(name)
+        if sound is None:
+            pygame = self.pygame
+            if self.audio is None:
+                try:
+                    pygame.mixer.init()
+                    self.audio = True
+                except pygame.error:
+                    self.audio = False
+            try:
+                sound = pygame.mixer.Sound(os.path.join(HERE, SOUNDS[name])) if self.audio else Silent()
+            except (pygame.error, FileNotFoundError):
+                sound = Silent()
+            self.sounds[name] = sound
+        return sound
+
+    def resize(self, width, height):
+        self.window = self.pygame.display.set_mode((width, height), self.pygame.RESIZABLE)
+        self.window_size = min(width, height - STATUS_HEIGHT)
+
+    def flip(self):
+        self.pygame.display.flip()
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - self.started
+
+    def close(self):
+        self.pygame.quit()
@@ -0,0 +1,311 @@
+class SearchLimitReached(Exception):
+    pass
+
+
+class BitmaskSolver:
+    def __init__(self, base=3):
+        self.base = base
+        # Work counters, cumulative until reset_counters(), and an optional
+        # node cap for the search in progress
+        self.nodes = 0
+        self.backtracks = 0
+        self.propagations = 0
+        self.max_nodes = None
+        self.side = base * base
+        self.size = self.side * self.side
+        self.all_digits = (1 << self.side) - 1
+        side = self.side
+        # Unit membership of every cell, as indexes into the row/col/box masks
+        self.row_of = [i // side for i in range(self.size)]
+        self.col_of = [i % side for i in range(self.size)]
+        self.box_of = [(i // side) // base * base + (i % side) // base for i in range(self.size)]
+        rows = [[r * side + c for c in range(side)] for r in range(side)]
+        cols = [[r * side + c for r in range(side)] for c in range(side)]
+        boxes = [[] for _ in range(side)]
+        for i in range(self.size):
+            boxes[self.box_of[i]].append(i)
+        self.units = rows + cols + boxes
+        # Digit for a single-bit mask
+        self.digit = {1 << d: d + 1 for d in range(side)}
+
+    def reset_counters(self):
+        self.nodes = self.backtracks = self.propagations = 0
+
+    def counters(self):
+        return {'nodes': self.nodes, 'backtracks': self.backtracks, 'propagations': self.propagations}
+
+    def load(self, board):
+        # Build solver state from a board, or None if the givens already clash
+        side = self.side
+        cells = [0] * self.size
+        rows = [0] * side
+        cols = [0] * side
+        boxes = [0] * side
+        for r in range(side):
+            for c in range(side):
+                num = board[r][c]
+                if num:
+                    i = r * side + c
+                    bit = 1 << (num - 1)
+                    b = self.box_of[i]
+                    if (rows[r] | cols[c] | boxes[b]) & bit:
+                        return None
+                    cells[i] = num
+                    rows[r] |= bit
+                    cols[c] |= bit
+                    boxes[b] |= bit
+        return cells, rows, cols, boxes
+
+    def place(self, state, i, num):
+        cells, rows, cols, boxes = state
+        bit = 1 << (num - 1)
+        cells[i] = num
+        rows[self.row_of[i]] |= bit
+        cols[self.col_of[i]] |= bit
+        boxes[self.box_of[i]] |= bit
+
+    def remove(self, state, i):
+        cells, rows, cols, boxes = state
+        mask = ~(1 << (cells[i] - 1))
+        cells[i] = 0
+        rows[self.row_of[i]] &= mask
+        cols[self.col_of[i]] &= mask
+        boxes[self.box_of[i]] &= mask
+
+    def candidates(self, state, i):
+        cells, rows, cols, boxes = state
+        if cells[i]:
+            return 0
+        return self.all_digits & ~(rows[self.row_of[i]] | cols[self.col_of[i]] | boxes[self.box_of[i]])
+
+    def propagate(self, state):
+        # Fill naked and hidden singles until nothing changes.
+        # Returns False on a contradiction, otherwise the most constrained
+        # empty cell as (index, candidates), or (None, 0) when the grid is full.
+        cells, rows, cols, boxes = state
+        row_of, col_of, box_of = self.row_of, self.col_of, self.box_of
+        all_digits = self.all_digits
+        steps = 0
+        while True:
+            progress = False
+            best = None
+            best_mask = 0
+            best_count = self.side + 1
+            for i in range(self.size):
+                if cells[i]:
+                    continue
+                mask = all_digits & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                if not mask:
+                    self.propagations += steps
+                    return False
+                if not mask & (mask - 1):
+                    self.place(state, i, self.digit[mask])
+                    steps += 1
+                    progress = True
+                    continue
+                count = bin(mask).count('1')
+                if count < best_count:
+                    best, best_mask, best_count = i, mask, count
+            if best is None:
+                self.propagations += steps
+                return None, 0
+            if progress:
+                continue
+            for unit in self.units:
+                once = twice = placed = 0
+                for i in unit:
+                    if cells[i]:
+                        placed |= 1 << (cells[i] - 1)
+                        continue
+                    mask = all_digits & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                    twice |= once & mask
+                    once |= mask
+                if (once | placed) != all_digits:
+                    self.propagations += steps
+                    return False
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for i in unit:
+                        if not cells[i] and self.candidates(state, i) & bit:
+                            self.place(state, i, self.digit[bit])
+                            steps += 1
+                            progress = True
+                            break
+            if not progress:
+                self.propagations += steps
+                return best, best_mask
+
+    def search(self, state, limit, solutions):
+        self.nodes += 1
+        if self.max_nodes and self.nodes > self.max_nodes:
+            raise SearchLimitReached
+        result = self.propagate(state)
+        if result is False:
+            self.backtracks += 1
+            return
+        i, mask = result
+        if i is None:
+            solutions.append(state[0][:])
+            return
+        cells, rows, cols, boxes = state
+        while mask and len(solutions) < limit:
+            bit = mask & -mask
+            mask ^= bit
+            child = (cells[:], rows[:], cols[:], boxes[:])
+            self.place(child, i, self.digit[bit])
+            self.search(child, limit, solutions)
+
+    def solutions(self, board, limit=2):
+        # Up to `limit` solutions of board, each a flat list of digits
+        state = self.load(board)
+        found = []
+        if state is not None:
+            self.search(state, limit, found)
+        return found
+
+    def has_other_solution(self, state, i, num, max_nodes=None):
+        # True if the grid in state can be completed with something other
+        # than num at cell i, None if that was not settled within max_nodes
+        # search nodes. state itself is left untouched.
+        self.max_nodes = self.nodes + max_nodes if max_nodes else None
+        try:
+            return self.find_other(state, i, num)
+        except SearchLimitReached:
+            return None
+        finally:
+            self.max_nodes = None
+
+    def find_other(self, state, i, num):
+        cells, rows, cols, boxes = state
+        mask = self.candidates(state, i) & ~(1 << (num - 1))
+        found = []
+        while mask and not found:
+            bit = mask & -mask
+            mask ^= bit
+            child = (cells[:], rows[:], cols[:], boxes[:])
+            self.place(child, i, self.digit[bit])
+            self.search(child, 1, found)
+        return bool(found)
+
+    def to_board(self, cells):
+        return [cells[r * self.side:(r + 1) * self.side] for r in range(self.side)]
+
+
+class ExactCoverSolver(BitmaskSolver):
+    # Algorithm X over the four Sudoku constraints (cell, row-digit,
+    # col-digit, box-digit). The matrix is held as column -> set of rows,
+    # the dictionary form of dancing links, and is built only from the
+    # candidates left open by the bitmask state so givens cost nothing.
+    def __init__(self, base=3):
+        super().__init__(base)
+        side, size = self.side, self.size
+        # Constraint columns covered by placing digit d + 1 in cell i (row i * side + d)
+        self.row_columns = []
+        for i in range(size):
+            r, c, b = self.row_of[i], self.col_of[i], self.box_of[i]
+            for d in range(side):
+                self.row_columns.append((
+                    i,
+                    size + r * side + d,
+                    2 * size + c * side + d,
+                    3 * size + b * side + d,
+                ))
+
+    def cover_matrix(self, state):
+        cells, rows, cols, boxes = state
+        side, size = self.side, self.size
+        matrix = {}
+        # Every constraint not yet met gets a column, even if nothing can meet it
+        for unit, (masks, offset) in enumerate(((rows, size), (cols, 2 * size), (boxes, 3 * size))):
+            for n in range(side):
+                open_digits = self.all_digits & ~masks[n]
+                while open_digits:
+                    bit = open_digits & -open_digits
+                    open_digits ^= bit
+                    matrix[offset + n * side + bit.bit_length() - 1] = set()
+        for i in range(size):
+            if cells[i]:
+                continue
+            matrix[i] = set()
+            mask = self.candidates(state, i)
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                row = i * side + bit.bit_length() - 1
+                for column in self.row_columns[row]:
+                    matrix[column].add(row)
+        return matrix
+
+    def select(self, matrix, row):
+        removed = []
+        for column in self.row_columns[row]:
+            for other in matrix[column]:
+                for other_column in self.row_columns[other]:
+                    if other_column != column:
+                        matrix[other_column].discard(other)
+            removed.append(matrix.pop(column))
+        return removed
+
+    def deselect(self, matrix, row, removed):
+        for column in reversed(self.row_columns[row]):
+            matrix[column] = removed.pop()
+            for other in matrix[column]:
+                for other_column in self.row_columns[other]:
+                    if other_column != column:
+                        matrix[other_column].add(other)
+
+    def cover(self, matrix, limit, chosen, found):
+        self.nodes += 1
+        if self.max_nodes and self.nodes > self.max_nodes:
+            raise SearchLimitReached
+        if not matrix:
+            found.append(list(chosen))
+            return
+        # Branch on the constraint with the fewest ways left to meet it
+        column = None
+        fewest = self.side + 1
+        for c, rows in matrix.items():
+            if len(rows) < fewest:
+                column, fewest = c, len(rows)
+                if fewest <= 1:
+                    break
+        if fewest == 0:
+            self.backtracks += 1
+            return
+        if fewest == 1:
+            self.propagations += 1  # Forced choice
+        for row in list(matrix[column]):
+            chosen.append(row)
+            removed = self.select(matrix, row)
+            self.cover(matrix, limit, chosen, found)
+            self.deselect(matrix, row, removed)
+            chosen.pop()
+            if len(found) >= limit:
+                return
+
+    def complete(self, cells, chosen):
+        cells = cells[:]
+        for row in chosen:
+            i, d = divmod(row, self.side)
+            cells[i] = d + 1
+        return cells
+
+    def solutions(self, board, limit=2):
+        state = self.load(board)
+        if state is None:
+            return []
+        found = []
+        self.cover(self.cover_matrix(state), limit, [], found)
+        return [self.complete(state[0], chosen) for chosen in found]
+
+    def find_other(self, state, i, num):
+        matrix = self.cover_matrix(state)
+        row = i * self.side + num - 1
+        if row in matrix[i]:
+            for column in self.row_columns[row]:
+                matrix[column].discard(row)
+        found = []
+        self.cover(matrix, 1, [], found)
+        return bool(found)
@@ -1,10 +1,47 @@
+import functools
+import os
 import random
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from grader import LEVELS, Grader
+from solver import BitmaskSolver, ExactCoverSolver
+
+# A puzzle generated from a seed is named by its seed id: generator version,
+# board side, difficulty, seed and optional grade, as '1.9.hard.5eed' or
+# '1.9.hard.5eed.expert'. Sudoku(base, seed).generate_puzzle(difficulty,
+# grade) always gives the same puzzle for the same version, so the id is all
+# that needs storing. Bump GENERATOR_VERSION with any change to generation
+# that changes what a seed gives; ids from other versions are refused.
+GENERATOR_VERSION = 1
+DIFFICULTIES = ('easy', 'medium', 'hard')
+SEED_ID = struct.Struct('<BBBBQ')  # version, base, difficulty, grade (0 for none), seed
+REGENERATE_CACHE = 256  # Puzzles kept by regenerate()
+SEED_BASES = (2, 3, 4, 5)  # Board sizes an id can name, 4x4 to 25x25
 
 class Sudoku:
-    def __init__(self):
-        self.base = 3
+    def __init__(self, base=3, seed=None):
+        self.random = random.Random(seed)
+        self.base = base
         self.side = self.base * self.base
         self.solutions_count = 0
+        # Exact cover keeps uniqueness checks tractable on 16x16 and up
+        self.solver = BitmaskSolver(base) if base <= 3 else ExactCoverSolver(base)
+        # Search nodes allowed per removal check while carving; None is exact.
+        # Proving uniqueness near the minimum gets very expensive past 9x9.
+        self.removal_budget = None if base <= 3 else 1000
+        # Fresh boards tried when generating for a grade
+        self.grade_attempts = 50
+        self.grader = None
+        self.generation_stats = {}
+        # Instrumentation: with instrument set, generation_stats also gets
+        # removal timings and solver counters. on_removal(row, col, outcome,
+        # seconds), when set, is called after every removal attempt.
+        self.instrument = False
+        self.on_removal = None
+        self.removals = {}
+        self.last_removal_seconds = 0.0  # Of the last try_removal, when timed
 
     def pattern(self, r, c):
         # Pattern for a baseline valid solution
@@ -12,7 +49,7 @@ class Sudoku:
 
     def shuffle(self, s):
         # Randomize the entries of an array
-        return random.sample(s, len(s))
+        return self.random.sample(s, len(s))
 
     def generate_board(self):
         # Generate a fully solved Sudoku board
@@ -24,67 +61,222 @@ class Sudoku:
         board = [[nums[self.pattern(r, c)] for c in cols] for r in rows]
         return board
 
-    def generate_puzzle(self, difficulty='medium'):
-        board = self.generate_board()
-        solution = [row[:] for row in board]
+    def generate_puzzle(self, difficulty='medium', grade=None):
+        # With a grade (one of grader.LEVELS) the board is carved to the
+        # difficulty's blank count and then further until the grader agrees,
+        # starting over on a fresh board up to grade_attempts times.
+        start = time.perf_counter()
+        self.removals = {'accepted': 0, 'rejected': 0, 'undecided': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+        if self.instrument:
+            self.solver.reset_counters()
+        target = self.get_empties_count(difficulty)
+        attempts = self.grade_attempts if grade else 1
+        for attempt in range(1, attempts + 1):
+            board = self.generate_board()
+            solution = [row[:] for row in board]
+            empties, undecided = self.carve(board, target)
+            if grade is None:
+                break
+            result, removed, skipped = self.carve_to_grade(board, grade)
+            empties += removed
+            undecided += skipped
+            if result['level'] == grade:
+                break
         squares = self.side * self.side
-        empties = self.get_empties_count(difficulty)
-        attempts = 5  # Number of attempts to remove numbers while ensuring uniqueness
-
-        while attempts > 0 and empties > 0:
-            row = random.randint(0, 8)
-            col = random.randint(0, 8)
-            if board[row][col] != 0:
-                removed_num = board[row][col]
-                board[row][col] = 0
-
-                board_copy = [row[:] for row in board]
-                self.solutions_count = 0
-                self.count_solutions(board_copy)
-                if self.solutions_count != 1:
-                    board[row][col] = removed_num  # Put it back if not unique
-                    attempts -= 1
-                else:
-                    empties -= 1
+        self.generation_stats = {
+            'difficulty': difficulty,
+            'target_empties': target,
+            'empties': empties,
+            'clues': squares - empties,
+            'reached_target': empties >= target,
+            'undecided': undecided,
+            'accepted_removals': self.removals['accepted'],
+            'rejected_removals': self.removals['rejected'],
+            'seconds': time.perf_counter() - start,
+        }
+        if grade is not None:
+            self.generation_stats.update({
+                'grade': result['level'],
+                'target_grade': grade,
+                'score': result['score'],
+                'hardest': result['hardest'],
+                'attempts': attempt,
+            })
+        if self.instrument:
+            self.generation_stats.update(self.solver.counters())
+            self.generation_stats['removal_seconds'] = self.removals['seconds']
+            self.generation_stats['max_removal_seconds'] = self.removals['max_seconds']
         return board, solution
 
+    def get_grader(self):
+        if self.grader is None:
+            self.grader = Grader(self.base)
+        return self.grader
+
+    def try_removal(self, state, board, row, col, report=True):
+        # Empty board[row][col] if the puzzle stays unique. Only an alternative
+        # digit in that cell has to be ruled out, since any other solution must
+        # differ there. Returns 'accepted', 'rejected' or 'undecided' (the
+        # check ran past removal_budget; the clue stays). Without report the
+        # caller passes the outcome to on_removal once it is final.
+        timed = self.instrument or self.on_removal is not None
+        seconds = 0.0
+        if timed:
+            start = time.perf_counter()
+        i = row * self.side + col
+        num = board[row][col]
+        self.solver.remove(state, i)
+        other = self.solver.has_other_solution(state, i, num, self.removal_budget)
+        if other is False:
+            board[row][col] = 0
+            outcome = 'accepted'
+        else:
+            self.solver.place(state, i, num)  # Put it back if not unique
+            outcome = 'rejected' if other else 'undecided'
+        self.removals[outcome] += 1
+        if timed:
+            seconds = time.perf_counter() - start
+            self.removals['seconds'] += seconds
+            self.removals['max_seconds'] = max(self.removals['max_seconds'], seconds)
+            if report and self.on_removal is not None:
+                self.on_removal(row, col, outcome, seconds)
+        self.last_removal_seconds = seconds
+        return outcome
+
+    def carve_to_grade(self, board, level):
+        # Grade a carved board and, while it grades easier than level, keep
+        # removing clues that leave it unique without grading past level.
+        # Returns (final grade, cells removed, checks left undecided).
+        grader = self.get_grader()
+        wanted = LEVELS.index(level)
+        result = grader.grade(board)
+        removed = undecided = 0
+        if LEVELS.index(result['level']) >= wanted:
+            return result, removed, undecided
+        state = self.solver.load(board)
+        for i in self.shuffle(range(self.side * self.side)):
+            row, col = divmod(i, self.side)
+            num = board[row][col]
+            if not num:
+                continue
+            outcome = self.try_removal(state, board, row, col, report=False)
+            done = False
+            if outcome == 'accepted':
+                trial = grader.grade(board)
+                if LEVELS.index(trial['level']) <= wanted:
+                    result = trial
+                    removed += 1
+                    done = trial['level'] == level
+                else:
+                    # Too hard, put it back
+                    board[row][col] = num
+                    self.solver.place(state, i, num)
+                    self.removals['accepted'] -= 1
+                    self.removals['rejected'] += 1
+                    outcome = 'rejected'
+            elif outcome == 'undecided':
+                undecided += 1
+            if self.on_removal is not None:
+                self.on_removal(row, col, outcome, self.last_removal_seconds)
+            if done:
+                break
+        return result, removed, undecided
+
+    def carve(self, board, empties):
+        # Remove up to `empties` numbers from a solved board in place while
+        # keeping the solution unique. Each cell is tried once in shuffled
+        # order. If fewer cells than asked could be removed and no check was
+        # undecided, the result is minimal: every remaining clue is needed for
+        # uniqueness.
+        # Returns (cells removed, checks left undecided).
+        state = self.solver.load(board)
+        removed = undecided = 0
+        for i in self.shuffle(range(self.side * self.side)):
+            if removed >= empties:
+                break
+            row, col = divmod(i, self.side)
+            outcome = self.try_removal(state, board, row, col)
+            if outcome == 'accepted':
+                removed += 1
+            elif outcome == 'undecided':
+                undecided += 1
+        return removed, undecided
+
+    def generate_seeded(self, difficulty='medium', grade=None):
+        # (puzzle, solution, seed id) for a puzzle regenerate() can rebuild
+        seed = self.random.getrandbits(64)
+        sudoku = Sudoku(self.base, seed=seed)
+        puzzle, solution = sudoku.generate_puzzle(difficulty, grade)
+        self.generation_stats = sudoku.generation_stats
+        return puzzle, solution, seed_id(seed, difficulty, self.base, grade)
+
+    def generate_many(self, n, difficulty='medium', workers=None, seed=None, chunksize=16, grade=None, ids=False):
+        # Generate n (puzzle, solution) pairs on a process pool, yielding them
+        # as they finish. Every puzzle gets its own seed drawn from `seed`, so
+        # the same seed always produces the same set of puzzles (the arrival
+        # order depends on scheduling). At most a few chunks per worker are in
+        # flight, so memory does not grow with n. With ids, each pair comes
+        # with its seed id as a third item.
+        if seed is None:
+            seed = self.random.getrandbits(64)
+        seeds = random.Random(seed)
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            chunks = {}
+            while n > 0 or pending:
+                while n > 0 and len(pending) < workers * 2:
+                    count = min(chunksize, n)
+                    n -= count
+                    chunk = [seeds.getrandbits(64) for _ in range(count)]
+                    future = pool.submit(_generate_chunk, self.base, difficulty, chunk, grade)
+                    chunks[future] = chunk
+                    pending.add(future)
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = chunks.pop(future)
+                    if not ids:
+                        yield from future.result()
+                        continue
+                    for (puzzle, solution), seed in zip(future.result(), chunk):
+                        yield puzzle, solution, seed_id(seed, difficulty, self.base, grade)
+
     def get_empties_count(self, difficulty):
-        # Determine the number of empty cells based on difficulty
+        # Determine the number of empty cells based on difficulty, given for
+        # 9x9 and scaled to the board size
         levels = {'easy': 36, 'medium': 45, 'hard': 54}
-        return levels.get(difficulty, 45)
-
-    def count_solutions(self, board):
-        empty = self.find_empty(board)
-        if not empty:
-            self.solutions_count += 1
-            return
-        if self.solutions_count > 1:
-            return
-        row, col = empty
-        for num in range(1, 10):
-            if self.is_valid(board, num, row, col):
-                board[row][col] = num
-                self.count_solutions(board)
-                board[row][col] = 0
+        return levels.get(difficulty, 45) * self.side * self.side // 81
+
+    def solve(self, board):
+        # Return a solved copy of board, or None if it has no solution
+        found = self.solver.solutions(board, limit=1)
+        if not found:
+            return None
+        return self.solver.to_board(found[0])
+
+    def count_solutions(self, board, limit=2):
+        # Count solutions of board, stopping once `limit` have been found
+        self.solutions_count = len(self.solver.solutions(board, limit))
+        return self.solutions_count
 
     def is_valid(self, board, num, row, col):
         # Check row
         if num in board[row]:
             return False
         # Check column
-        if num in [board[r][col] for r in range(9)]:
+        if num in [board[r][col] for r in range(self.side)]:
             return False
         # Check box
-        start_row, start_col = 3 * (row // 3), 3 * (col // 3)
-        for r in range(3):
-            for c in range(3):
+        start_row, start_col = self.base * (row // self.base), self.base * (col // self.base)
+        for r in range(self.base):
+            for c in range(self.base):
                 if board[start_row + r][start_col + c] == num:
                     return False
         return True
 
     def find_empty(self, board):
-        for r in range(9):
-            for c in range(9):
+        for r in range(self.side):
+            for c in range(self.side):
                 if board[r][c] == 0:
                     return (r, c)
         return None
@@ -102,3 +294,68 @@ class Sudoku:
                 num = board[r][c]
                 line += f"{'.' if num == 0 else num} ".rjust(num_size + 1)
             print(line)
+
+
+def seed_id(seed, difficulty='medium', base=3, grade=None, version=GENERATOR_VERSION):
+    text = f"{version}.{base * base}.{difficulty}.{seed:x}"
+    return f"{text}.{grade}" if grade else text
+
+
+def parse_seed_id(text):
+    # (version, base, difficulty, grade, seed); ValueError if text is not an id
+    parts = text.strip().split('.')
+    try:
+        version, side, difficulty, seed = int(parts[0]), int(parts[1]), parts[2], int(parts[3], 16)
+    except (IndexError, ValueError):
+        raise ValueError(f"not a seed id: {text!r}") from None
+    base = int(round(side ** 0.5))
+    grade = parts[4] if len(parts) == 5 else None
+    if (len(parts) > 5 or base not in SEED_BASES or base * base != side or difficulty not in DIFFICULTIES
+            or not 0 <= seed < 1 << 64 or (len(parts) == 5 and grade not in LEVELS)):
+        raise ValueError(f"not a seed id: {text!r}")
+    return version, base, difficulty, grade, seed
+
+
+def pack_seed_id(text):
+    # The id in SEED_ID.size bytes
+    version, base, difficulty, grade, seed = parse_seed_id(text)
+    grade = LEVELS.index(grade) + 1 if grade else 0
+    return SEED_ID.pack(version, base, DIFFICULTIES.index(difficulty), grade, seed)
+
+
+def unpack_seed_id(data):
+    version, base, difficulty, grade, seed = SEED_ID.unpack(data)
+    if difficulty >= len(DIFFICULTIES) or grade > len(LEVELS):
+        raise ValueError("not a packed seed id")
+    return seed_id(seed, DIFFICULTIES[difficulty], base, LEVELS[grade - 1] if grade else None, version)
+
+
+@functools.lru_cache(maxsize=REGENERATE_CACHE)
+def _regenerate(base, difficulty, grade, seed):
+    puzzle, solution = Sudoku(base, seed=seed).generate_puzzle(difficulty, grade)
+    return tuple(map(tuple, puzzle)), tuple(map(tuple, solution))
+
+
+def regenerate(text):
+    # (puzzle, solution) named by a seed id. Recently used ids are cached, so
+    # asking again is free; every call gets its own lists.
+    version, base, difficulty, grade, seed = parse_seed_id(text)
+    if version != GENERATOR_VERSION:
+        raise ValueError(f"{text} needs generator version {version}, this is version {GENERATOR_VERSION}")
+    puzzle, solution = _regenerate(base, difficulty, grade, seed)
+    return [list(row) for row in puzzle], [list(row) for row in solution]
+
+
+def _generate_chunk(base, difficulty, seeds, grade=None):
+    # Process pool task: one freshly seeded generator per puzzle
+    puzzles = []
+    for seed in seeds:
+        sudoku = Sudoku(base, seed=seed)
+        puzzles.append(sudoku.generate_puzzle(difficulty, grade))
+    return puzzles
+
+
+if __name__ == '__main__':
+    # python -m sudoku solve|validate|grade|generate
+    from cli import main
+    raise SystemExit(main())
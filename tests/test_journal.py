@@ -0,0 +1,75 @@
+import json
+
+import journal
+from sudoku import Sudoku
+
+
+def blanks(puzzle):
+    return [(r, c) for r, row in enumerate(puzzle) for c, num in enumerate(row) if not num]
+
+
+def test_replay_after_reset_and_snapshot(tmp_path):
+    # Play, reset, play on past a snapshot and reload: the reloaded board and
+    # undo stack match the game as it was played
+    puzzle, solution = Sudoku(seed=1).generate_puzzle('easy')
+    board = puzzle  # The GUI plays on the list it passes to create
+    path = str(tmp_path / 'game.journal')
+    saved = journal.Journal.create(path, puzzle, solution, 'easy', fsync=False)
+    cells = blanks(puzzle)
+    moves = []
+
+    def move(r, c, num):
+        saved.append(journal.MOVE, r, c, board[r][c], num)
+        moves.append((r, c, board[r][c]))
+        board[r][c] = num
+
+    r, c = cells[0]
+    move(r, c, solution[r][c])
+    saved.append(journal.RESET)
+    board[r][c] = 0
+    moves.clear()
+    n = 0
+    while saved.records < journal.SNAPSHOT_EVERY + 3:
+        r, c = cells[1 + n % (len(cells) - 1)]
+        move(r, c, n % 9 + 1)
+        n += 1
+    saved.close()
+
+    loaded = journal.Journal.open(path, fsync=False)
+    assert loaded.records == journal.SNAPSHOT_EVERY + 3
+    assert loaded.state['board'] == board
+    assert loaded.state['moves'] == moves
+    assert loaded.puzzle == [row[:] for row in Sudoku(seed=1).generate_puzzle('easy')[0]]
+    loaded.close()
+
+
+def test_damaged_records_are_refused(tmp_path):
+    puzzle, solution = Sudoku(seed=2).generate_puzzle('easy')
+    r, c = blanks(puzzle)[0]
+    given = next((r, c) for r, row in enumerate(puzzle) for c, num in enumerate(row) if num)
+    for record in ((journal.MOVE, 9, 0, 0, 1), (journal.MOVE, r, c, 0, 10), (0, r, c, 0, 1),
+                   (journal.MOVE, given[0], given[1], 0, 1)):
+        path = str(tmp_path / 'game.journal')
+        journal.Journal.create(path, puzzle, solution, 'easy', fsync=False).close()
+        with open(path, 'ab') as f:
+            f.write(journal.RECORD.pack(*record, 1.0))
+        assert journal.Journal.open(path, fsync=False) is None
+
+
+def test_damaged_snapshot_is_ignored(tmp_path):
+    puzzle, solution = Sudoku(seed=3).generate_puzzle('easy')
+    path = str(tmp_path / 'game.journal')
+    saved = journal.Journal.create(path, puzzle, solution, 'easy', fsync=False)
+    r, c = blanks(puzzle)[0]
+    for n in range(journal.SNAPSHOT_EVERY):
+        saved.append(journal.MOVE, r, c, 0, n % 9 + 1)
+    board = saved.state['board']
+    saved.close()
+    with open(journal.snapshot_path(path)) as f:
+        snapshot = json.load(f)
+    snapshot['state']['board'] = [row[:8] for row in snapshot['state']['board']]
+    with open(journal.snapshot_path(path), 'w') as f:
+        json.dump(snapshot, f)
+    loaded = journal.Journal.open(path, fsync=False)
+    assert loaded.state['board'] == board  # Replayed from the records instead
+    loaded.close()